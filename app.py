@@ -4,27 +4,100 @@ from PIL import Image
 from docx import Document
 from langchain_ollama import ChatOllama
 from langchain_chroma import Chroma
-from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.prompts import PromptTemplate
 from langchain.chains.combine_documents import create_stuff_documents_chain
-from langchain.chains import create_retrieval_chain
 from langchain_community.embeddings.fastembed import FastEmbedEmbeddings
 from langchain.docstore.document import Document as LCDocument
 from xml.etree.ElementTree import tostring
-from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, as_completed, wait
+import multiprocessing
+import logging
+import re
+import json
+import chromadb
 import pyodbc
 
+from observability import setup_logging, timed
+from ingest_worker import parse_and_split, CHUNK_SCHEMA_VERSION
+from embedding_cache import CachedEmbeddings
+from query_cache import TTLCache
+from partition_router import PartitionRouter, PartitionedRetriever, partition_slug, scan_partitions
+
 #import streamlit as st
 
 CHROMA_DB_DIR = "./sql_chroma_db"
-DOCUMENTS_FOLDER = "./documents"
+DOCUMENTS_FOLDER = os.getenv("DOCUMENTS_FOLDER", "./documents")
+UPLOAD_DIR = "./uploaded_docs"
+os.makedirs(UPLOAD_DIR, exist_ok=True)
 Collection_Name = "g2g_docs"
+OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://localhost:11434")
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", str(os.cpu_count() or 1)))
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "256"))
+# Optional {"file.docx": "Process flow name"}; unmapped files get a partition of their own.
+PARTITION_MAP = json.loads(os.getenv("PARTITION_MAP", "{}"))
+# 1 = one Chroma collection per partition; 0 = a single collection filtered by partition.
+SHARD_PARTITIONS = os.getenv("SHARD_PARTITIONS", "0") == "1"
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+EMBED_MODEL = "BAAI/bge-small-en-v1.5"
+embedder = CachedEmbeddings(FastEmbedEmbeddings(model_name=EMBED_MODEL), EMBED_MODEL)
+
+# Part of every query-level cache/flight key so answers computed against an older
+# corpus are never reused. Bumped only once the chain rebuilt after an index change
+# is installed: bumping earlier lets requests still on the old retriever cache
+# their results under the new version.
+_corpus_version = 0
+
+def get_corpus_version():
+    return _corpus_version
+
+def bump_corpus_version():
+    global _corpus_version
+    _corpus_version += 1
+
+def normalize_query(text):
+    return re.sub(r"\s+", " ", text).strip().rstrip("?!. ").lower()
+
+def document_path(fname):
+    """Bundled documents win over uploads with the same name, as in /image."""
+    for folder in [DOCUMENTS_FOLDER, UPLOAD_DIR]:
+        path = os.path.join(folder, fname)
+        if os.path.exists(path):
+            return path
+    return os.path.join(DOCUMENTS_FOLDER, fname)
+
+def _indexable_documents():
+    """Bundled .docx files plus uploaded ones not shadowed by a bundled name."""
+    names = set()
+    for folder in [DOCUMENTS_FOLDER, UPLOAD_DIR]:
+        names.update(f for f in os.listdir(folder) if f.endswith('.docx') and not f.startswith('.'))
+    return sorted(names)
+
+def partition_for(filename):
+    return partition_slug(PARTITION_MAP.get(filename) or os.path.splitext(filename)[0])
+
+def _collection_name(partition):
+    return f"{Collection_Name}__{partition}" if SHARD_PARTITIONS else Collection_Name
+
+def _store(name):
+    return Chroma(persist_directory=CHROMA_DB_DIR, embedding_function=embedder, collection_name=name)
+
+def _existing_stores():
+    """Every collection this app owns, sharded or not, by collection name."""
+    client = chromadb.PersistentClient(path=CHROMA_DB_DIR)
+    names = [getattr(c, "name", c) for c in client.list_collections()]
+    return {n: _store(n) for n in names if n == Collection_Name or n.startswith(f"{Collection_Name}__")}
 
-embedder = FastEmbedEmbeddings(model_name="BAAI/bge-small-en-v1.5")
 #vector_store = Chroma(persist_directory=CHROMA_DB_DIR, embedding_function=embedder,collection_name=Collection_Name)
 #print("Vector store loaded:", vector_store._collection.count())
 
 def extract_text_image_link_pairs(doc_path):
+    with timed("docx_parse"):
+        return _extract_text_image_link_pairs(doc_path)
+
+def _extract_text_image_link_pairs(doc_path):
     from lxml import etree
     etree.register_namespace("a", "http://schemas.openxmlformats.org/drawingml/2006/main")
     etree.register_namespace("r", "http://schemas.openxmlformats.org/officeDocument/2006/relationships")
@@ -41,7 +114,7 @@ def extract_text_image_link_pairs(doc_path):
                 img = Image.open(BytesIO(image_data)).convert("RGB")
                 images[rel.rId] = img
             except Exception as e:
-                print("Image error:", e)
+                logger.warning("Image error in %s: %s", doc_path, e)
 
     for para in doc.paragraphs:
         para_text = para.text.strip()
@@ -72,62 +145,143 @@ def extract_text_image_link_pairs(doc_path):
                 para_links.append(rels[rId].target_ref)
         link_chunks.append(para_links)
 
-    for i, para in enumerate(doc.paragraphs):
-        drawings = para._element.xpath(".//w:drawing")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Extracted %s paragraphs, %s images, and %s links from %s", len(text_chunks),
+                     sum(len(imgs) for imgs in image_chunks), sum(len(links) for links in link_chunks), doc_path)
+    return list(zip(text_chunks, image_chunks, link_chunks))
 
+def _parsed_documents(paths):
+    """Yield (filename, chunks) per document as worker processes finish them.
 
-    print(f"Extracted {len(text_chunks)} paragraphs, {sum(len(imgs) for imgs in image_chunks)} images, and {sum(len(links) for links in link_chunks)} links from {doc_path}")
-    return list(zip(text_chunks, image_chunks, link_chunks))
+    At most 2 x INGEST_WORKERS documents are in flight, so parsing overlaps with
+    embedding in the caller without ever holding the whole corpus in memory.
+    """
+    workers = min(INGEST_WORKERS, len(paths))
+    if workers <= 1:
+        for path in paths:
+            name = os.path.basename(path)
+            yield name, parse_and_split(path, name, partition_for(name))
+        return
+    # spawn, not fork: forking a process already running ONNX Runtime and server threads is unsafe.
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        pending = {}
+        for path in paths:
+            if len(pending) >= workers * 2:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield pending.pop(future), future.result()
+            name = os.path.basename(path)
+            pending[pool.submit(parse_and_split, path, name, partition_for(name))] = name
+        for future in as_completed(pending):
+            yield pending[future], future.result()
 
 def ingest(): 
+    docx_files = _indexable_documents()
     if os.path.exists(CHROMA_DB_DIR):
-        # Check if there are any .docx files in the documents folder
-        docx_files = [f for f in os.listdir(DOCUMENTS_FOLDER) if f.endswith('.docx')]
-        if not docx_files:
-            print("Chroma DB already exists, but no documents found.")
-        else:
-            # Check if all docx files are already present in the DB collection
-            db = Chroma(persist_directory=CHROMA_DB_DIR, embedding_function=embedder, collection_name=Collection_Name)
-            existing_metadatas = db.get(include=['metadatas'])['metadatas']
-            existing_sources = set()
-            for meta_list in existing_metadatas:
-                if  "source" in meta_list and meta_list["source"]:
-                        existing_sources.add(meta_list["source"])
-            missing_files = [f for f in docx_files if f not in existing_sources]
-            print(f"Missing files: {missing_files}")
-            if not missing_files:
-                print(f"Chroma DB already exists. All {len(docx_files)} document(s) already ingested: {docx_files}. Skipping ingestion.")
-                return
-            else:
-                print(f"Chroma DB exists, but new documents found: {missing_files}. Proceeding with ingestion.")
-
-    print("Starting ingestion...")
-
-    all_chunks = []
-    
-    splitter = RecursiveCharacterTextSplitter(chunk_size=800, chunk_overlap=200)
-
-    for filename in os.listdir(DOCUMENTS_FOLDER):
-        if filename.endswith(".docx"):
-            path = os.path.join(DOCUMENTS_FOLDER, filename)
-            para_triplets = extract_text_image_link_pairs(path)
-            for i, (para_text, _, _) in enumerate(para_triplets):
-                if len(para_text.strip()) < 5:
+        # Check if all docx files are already present in the DB collection(s).
+        # A chunk is stale if it was chunked under an older schema, or sits in the
+        # wrong partition/collection after PARTITION_MAP or SHARD_PARTITIONS changed.
+        stores = _existing_stores()
+        indexable = set(docx_files)
+        existing_sources = set()
+        stale_sources = set()
+        for name, db in stores.items():
+            stored = db.get(include=['metadatas'])
+            orphaned = []
+            for chunk_id, meta_list in zip(stored['ids'], stored['metadatas']):
+                meta_list = meta_list or {}
+                if not meta_list.get("source") or meta_list["source"] not in indexable:
+                    orphaned.append(chunk_id)
                     continue
-                splits = splitter.split_text(para_text)
-                for c in splits:
-                    all_chunks.append(LCDocument(
-                        page_content=c,
-                        metadata={"source": filename, "para_index": i}
-                    ))
-    print(f"📄 Total chunks being ingested: {len(all_chunks)}")
-    db = Chroma.from_documents(documents=all_chunks, embedding=embedder, persist_directory=CHROMA_DB_DIR, collection_name=Collection_Name)
-    #db.persist()
-    print("✅ Chroma DB created and persisted.")
+                partition = partition_for(meta_list["source"])
+                if (meta_list.get("chunk_schema") == CHUNK_SCHEMA_VERSION
+                        and meta_list.get("partition") == partition
+                        and name == _collection_name(partition)):
+                    existing_sources.add(meta_list["source"])
+                else:
+                    stale_sources.add(meta_list["source"])
+            # Chunks whose document was removed, renamed or moved out of the scanned
+            # folders (or that carry no source at all) can never be re-chunked into a
+            # partition, so the router would never reach them; drop them instead.
+            if orphaned:
+                logger.info("Removing %s orphaned chunk(s) from %s", len(orphaned), name)
+                for start in range(0, len(orphaned), 5000):
+                    db._collection.delete(ids=orphaned[start:start + 5000])
+        # Check if there are any .docx files in the documents or upload folder
+        if not docx_files:
+            logger.info("Chroma DB already exists, but no documents found.")
+            return
+        missing_files = [f for f in docx_files if f not in existing_sources or f in stale_sources]
+        logger.info("Missing files: %s", missing_files)
+        if not missing_files:
+            logger.info("Chroma DB already exists. All %s document(s) already ingested: %s. Skipping ingestion.", len(docx_files), docx_files)
+            return
+        logger.info("Chroma DB exists, but new documents found: %s. Proceeding with ingestion.", missing_files)
+        # Stale documents are dropped from every collection and re-chunked.
+        for f in missing_files:
+            if f in stale_sources:
+                logger.info("Re-chunking %s (chunk schema %s, partition %s)", f, CHUNK_SCHEMA_VERSION, partition_for(f))
+                for db in stores.values():
+                    db._collection.delete(where={"source": f})
+        docx_files = missing_files
+
+    logger.info("Starting ingestion...")
+    _index([document_path(f) for f in docx_files])
+
+def ingest_files(paths):
+    """Index exactly these .docx files in one pass, wherever they live.
+
+    Chunks already stored under the same file names are replaced, so
+    re-uploading a changed document doesn't leave its old chunks behind.
+    """
+    paths = [p for p in paths if p.endswith('.docx')]
+    if not paths:
+        return
+    _delete_sources([os.path.basename(p) for p in paths])
+    logger.info("Indexing %s uploaded document(s)...", len(paths))
+    _index(paths)
+
+def remove_documents(names):
+    """Drop every chunk stored for these file names, e.g. to undo a failed upload."""
+    _delete_sources(names)
+
+def _delete_sources(names):
+    if not names or not os.path.exists(CHROMA_DB_DIR):
+        return False
+    for db in _existing_stores().values():
+        for name in names:
+            db._collection.delete(where={"source": name})
+    return True
+
+def _index(paths):
+    stores = {}
+    batches = {}  # collection name -> pending chunks
+    total = 0
+
+    def flush(name):
+        nonlocal total
+        if name not in stores:
+            stores[name] = _store(name)
+        stores[name].add_documents(batches[name])
+        total += len(batches[name])
+        batches[name] = []
+
+    for filename, chunks in _parsed_documents(paths):
+        logger.info("Parsed %s: %s chunks (partition %s)", filename, len(chunks), partition_for(filename))
+        for text, metadata in chunks:
+            name = _collection_name(metadata["partition"])
+            batches.setdefault(name, []).append(LCDocument(page_content=text, metadata=metadata))
+            if len(batches[name]) >= INGEST_BATCH_SIZE:
+                flush(name)
+    for name in batches:
+        if batches[name]:
+            flush(name)
+    logger.info("📄 Total chunks ingested: %s", total)
+    logger.info("✅ Chroma DB created and persisted.")
 
 def build_chain():
-    print("Building Chain")
-    model = ChatOllama(model="llama3.2", temperature=0.4,
+    logger.info("Building Chain")
+    model = ChatOllama(model="llama3.2", temperature=0.4, base_url=OLLAMA_HOST,
                        options={
             "num_predict": 200,
             "top_p": 0.9,
@@ -162,20 +316,41 @@ def build_chain():
     """
     )
 
-    embedder = FastEmbedEmbeddings(model_name="BAAI/bge-small-en-v1.5")
-    vector_store = Chroma(persist_directory=CHROMA_DB_DIR, embedding_function=embedder,collection_name=Collection_Name)
-    print("Vector store loaded:", vector_store._collection.count())
-    retriever = vector_store.as_retriever(search_type="mmr", search_kwargs={"k": 6, "fetch_k": 12, "lambda_mult": 1.0})
+    # Queries are routed to the few partitions closest to them, so search cost
+    # follows partition size rather than the whole corpus.
+    partition_stores, centroids, words, counts = scan_partitions(_existing_stores().values())
+    logger.info("Vector store loaded: %s chunks in %s partitions", sum(counts.values()), len(counts))
+    retriever = PartitionedRetriever(
+        partition_stores=partition_stores,
+        router=PartitionRouter(centroids, words),
+        embeddings=embedder,
+        search_type="mmr",
+        search_kwargs={"k": 6, "fetch_k": 12, "lambda_mult": 1.0},
+    )
+    # Retrieval happens in the caller (cached_retrieve + per-source dedup), so the
+    # chain only stuffs the documents it is given as "context" into the prompt.
     doc_chain = create_stuff_documents_chain(model, prompt)
-    return create_retrieval_chain(retriever, doc_chain), retriever, model
+    return doc_chain, retriever, model
+
+RETRIEVAL_CACHE_SIZE = int(os.getenv("RETRIEVAL_CACHE_SIZE", "512"))
+RETRIEVAL_CACHE_TTL = float(os.getenv("RETRIEVAL_CACHE_TTL", "600"))
+retrieval_cache = TTLCache("retrieval", RETRIEVAL_CACHE_SIZE, RETRIEVAL_CACHE_TTL)
 
-#@lru_cache(maxsize=128)
-#def cached_retrieve(user_input: str):
-    #return retriever.get_relevant_documents(user_input)
- #   return retriever.invoke(user_input)
+def cached_retrieve(retriever, user_input):
+    params = json.dumps([retriever.search_type, retriever.search_kwargs], sort_keys=True, default=str)
+    key = (normalize_query(user_input), params, _corpus_version)
+    docs = retrieval_cache.get(key)
+    if docs is None:
+        with timed("retrieval_search"):
+            docs = retriever.invoke(user_input)
+        retrieval_cache.put(key, tuple(docs))
+    return list(docs)
 
 
-ingest()
+# Spawned ingest workers re-import the parent's __main__ as __mp_main__; don't
+# ingest again from inside them when app.py is run directly.
+if __name__ != "__mp_main__":
+    ingest()
 #chat_chain, chat_retriever,llm = build_chain()
 
 #query = st.text_input("Ask a question:")
@@ -0,0 +1,68 @@
+"""Compare two bench.run result files.
+
+    python -m bench.compare baseline.json candidate.json --threshold 10
+
+Prints per-endpoint deltas for p50/p95/p99, throughput and peak RSS, and
+exits with status 1 if any latency percentile or RSS grew (or throughput
+fell) by more than the threshold percentage.
+"""
+import argparse
+import json
+import sys
+
+METRICS = [
+    ("p50", lambda r: r["latency_ms"]["p50"], True),
+    ("p95", lambda r: r["latency_ms"]["p95"], True),
+    ("p99", lambda r: r["latency_ms"]["p99"], True),
+    ("rps", lambda r: r["throughput_rps"], False),
+    ("rss_peak", lambda r: r["rss_mb_peak"], True),
+]
+
+
+def _pct(old, new):
+    if old in (None, 0) or new is None:
+        return None
+    return (new - old) / old * 100.0
+
+
+def compare(baseline, candidate, threshold):
+    rows, regressions = [], []
+    for endpoint in sorted(set(baseline["results"]) & set(candidate["results"])):
+        old, new = baseline["results"][endpoint], candidate["results"][endpoint]
+        for name, get, lower_is_better in METRICS:
+            a, b = get(old), get(new)
+            delta = _pct(a, b)
+            worse = delta is not None and (delta > threshold if lower_is_better else delta < -threshold)
+            rows.append((endpoint, name, a, b, delta, worse))
+            if worse:
+                regressions.append(f"{endpoint}.{name}")
+    return rows, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=10.0, help="allowed regression in percent")
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+
+    print(f"baseline:  {baseline['meta'].get('commit')}  {baseline['meta'].get('timestamp')}")
+    print(f"candidate: {candidate['meta'].get('commit')}  {candidate['meta'].get('timestamp')}")
+    rows, regressions = compare(baseline, candidate, args.threshold)
+    print(f"{'endpoint':12s} {'metric':9s} {'baseline':>10s} {'candidate':>10s} {'delta':>8s}")
+    for endpoint, name, a, b, delta, worse in rows:
+        d = f"{delta:+.1f}%" if delta is not None else "n/a"
+        print(f"{endpoint:12s} {name:9s} {str(a):>10s} {str(b):>10s} {d:>8s}{'  <-- regression' if worse else ''}")
+
+    if regressions:
+        print(f"Regressions over {args.threshold}%: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""Seeded synthetic .docx corpus for benchmarks.
+
+Each document mimics an SOP manual: headings, short step paragraphs, inline
+screenshots and hyperlinks. The same seed always yields the same text,
+image sizes and link layout, so results stay comparable across commits.
+
+    python -m bench.corpus --out /tmp/g2g-corpus --docs 10 --seed 0
+"""
+import argparse
+import os
+import random
+from io import BytesIO
+
+from docx import Document
+from docx.opc.constants import RELATIONSHIP_TYPE as RT
+from docx.oxml import OxmlElement
+from docx.oxml.ns import qn
+from docx.shared import Inches
+from PIL import Image
+
+TOPICS = ["Leave", "Onboarding", "Timesheet", "Expense", "Travel", "Asset", "Training", "Payroll"]
+VERBS = ["Open", "Click", "Select", "Enter", "Review", "Submit", "Approve", "Verify", "Upload", "Notify"]
+OBJECTS = [
+    "the request form", "your supervisor", "the portal home page", "the approval queue",
+    "the start and end dates", "the attachment section", "the confirmation email",
+    "the team calendar", "the policy document", "the status dashboard",
+]
+
+
+def _sentence(rng, topic):
+    return f"{rng.choice(VERBS)} {rng.choice(OBJECTS)} for the {topic.lower()} process."
+
+
+def _add_hyperlink(paragraph, url, text):
+    r_id = paragraph.part.relate_to(url, RT.HYPERLINK, is_external=True)
+    hyperlink = OxmlElement("w:hyperlink")
+    hyperlink.set(qn("r:id"), r_id)
+    run = OxmlElement("w:r")
+    t = OxmlElement("w:t")
+    t.text = text
+    run.append(t)
+    hyperlink.append(run)
+    paragraph._p.append(hyperlink)
+
+
+def _image(rng, width, height):
+    img = Image.new("RGB", (width, height), tuple(rng.randrange(256) for _ in range(3)))
+    # A few noisy bands so PNG/WebP encoders do real work.
+    band = Image.effect_noise((width, max(1, height // 8)), 64).convert("RGB")
+    for y in range(0, height, height // 4 or 1):
+        img.paste(band, (0, y))
+    buf = BytesIO()
+    img.save(buf, format="PNG")
+    buf.seek(0)
+    return buf
+
+
+def generate_document(path, rng, sections=12, steps_per_section=8, image_every=5,
+                      link_every=7, image_size=(1280, 720)):
+    topic = rng.choice(TOPICS)
+    doc = Document()
+    doc.add_heading(f"{topic} Process and User Guide", level=0)
+    step = 0
+    for s in range(sections):
+        doc.add_heading(f"{s + 1}. {topic} step group {s + 1}", level=1)
+        for _ in range(steps_per_section):
+            step += 1
+            para = doc.add_paragraph(" ".join(_sentence(rng, topic) for _ in range(rng.randint(1, 3))))
+            if step % link_every == 0:
+                _add_hyperlink(para, f"https://example.com/{topic.lower()}/{step}", " (details)")
+            if step % image_every == 0:
+                w = rng.randint(image_size[0] // 2, image_size[0])
+                h = rng.randint(image_size[1] // 2, image_size[1])
+                doc.add_paragraph().add_run().add_picture(_image(rng, w, h), width=Inches(5))
+    doc.save(path)
+    return topic
+
+
+def generate_corpus(out_dir, docs=5, seed=0, **kwargs):
+    """Write `docs` documents into `out_dir`. Returns the file names written."""
+    os.makedirs(out_dir, exist_ok=True)
+    rng = random.Random(seed)
+    names = []
+    for i in range(docs):
+        name = f"doc{i}.docx"
+        generate_document(os.path.join(out_dir, name), rng, **kwargs)
+        names.append(name)
+    return names
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", required=True)
+    parser.add_argument("--docs", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--sections", type=int, default=12)
+    parser.add_argument("--steps-per-section", type=int, default=8)
+    parser.add_argument("--image-every", type=int, default=5)
+    parser.add_argument("--link-every", type=int, default=7)
+    args = parser.parse_args()
+    names = generate_corpus(
+        args.out, docs=args.docs, seed=args.seed, sections=args.sections,
+        steps_per_section=args.steps_per_section, image_every=args.image_every,
+        link_every=args.link_every,
+    )
+    print(f"Wrote {len(names)} documents to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,352 @@
+"""Load-test driver for the G2G backend.
+
+Builds a throwaway workspace (seeded .docx corpus, SQLite user tables),
+starts the stub Ollama and the real FastAPI app against them, then drives
+each endpoint at a fixed concurrency and records latency percentiles,
+throughput and server RSS. Results are written as JSON so two runs can be
+compared with bench.compare.
+
+    python -m bench.run --concurrency 8 --requests 200 --out results.json
+    python -m bench.run --endpoints chat,image --tokens-per-sec 15
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+import httpx
+import psutil
+
+from bench import corpus, sqlite_db
+from bench.stub_ollama import start_stub_ollama
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ENDPOINTS = ["chat", "image", "links", "get_session", "get_history", "suggest", "upload"]
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "HEAD"], cwd=REPO_ROOT, text=True, stderr=subprocess.DEVNULL
+        ).strip()
+    except Exception:
+        return None
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * pct / 100.0
+    lo, hi = int(k), min(int(k) + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+class RssSampler:
+    """Samples the server process tree RSS in a background thread."""
+
+    def __init__(self, pid, interval=0.25):
+        self.proc = psutil.Process(pid)
+        self.interval = interval
+        self.samples = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _rss(self):
+        procs = [self.proc] + self.proc.children(recursive=True)
+        total = 0
+        for p in procs:
+            try:
+                total += p.memory_info().rss
+            except psutil.Error:
+                pass
+        return total
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.samples.append(self._rss())
+            except psutil.Error:
+                return
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self.samples.clear()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def summary(self):
+        if not self.samples:
+            return {"rss_mb_start": None, "rss_mb_peak": None, "rss_mb_end": None}
+        mb = 1024 * 1024
+        return {
+            "rss_mb_start": round(self.samples[0] / mb, 1),
+            "rss_mb_peak": round(max(self.samples) / mb, 1),
+            "rss_mb_end": round(self.samples[-1] / mb, 1),
+        }
+
+
+class Workload:
+    """Seeded request generators for each endpoint."""
+
+    def __init__(self, workspace, doc_names, emails, db_path, seed):
+        self.rng = random.Random(seed)
+        self.workspace = workspace
+        self.doc_names = doc_names
+        self.emails = emails
+        self.sessions = {e: sqlite_db.session_ids(db_path, e) for e in emails[:20]}
+        self.questions = [
+            f"How do I {verb.lower()} {obj} for the {topic.lower()} process?"
+            for topic in corpus.TOPICS for verb in corpus.VERBS[:4] for obj in corpus.OBJECTS[:3]
+        ]
+        self.image_ids, self.link_targets = self._scan_corpus()
+        with open(os.path.join(workspace, "documents", doc_names[0]), "rb") as f:
+            self.upload_blob = f.read()
+
+    def _scan_corpus(self):
+        sys.path.insert(0, REPO_ROOT)
+        from docx import Document
+
+        image_ids, link_targets = [], []
+        for name in self.doc_names:
+            doc = Document(os.path.join(self.workspace, "documents", name))
+            for idx, para in enumerate(doc.paragraphs):
+                drawings = para._element.xpath(".//w:drawing")
+                for i in range(len(drawings)):
+                    image_ids.append(f"{name}::img{idx}_{i}")
+                if para._element.xpath(".//w:hyperlink"):
+                    link_targets.append((name, idx))
+        return image_ids or ["missing.docx::img0_0"], link_targets or [(self.doc_names[0], 0)]
+
+    def request(self, endpoint, n):
+        rng = self.rng
+        if endpoint == "chat":
+            return "POST", "/chat", {"json": {"question": rng.choice(self.questions), "username": f"user{n % 50}"}}
+        if endpoint == "image":
+            return "GET", "/image", {"params": {"image_id": rng.choice(self.image_ids)}}
+        if endpoint == "links":
+            file, idx = rng.choice(self.link_targets)
+            return "GET", "/links", {"params": {"file": file, "idx": idx}}
+        if endpoint == "get_session":
+            email = rng.choice(list(self.sessions))
+            return "POST", "/get_session", {"json": {"email": email, "session_id": rng.choice(self.sessions[email])}}
+        if endpoint == "get_history":
+            return "GET", "/get_history", {"params": {"email": rng.choice(self.emails)}}
+        if endpoint == "suggest":
+            return "GET", "/suggest", {"params": {"q": rng.choice(self.questions)[:24]}}
+        if endpoint == "upload":
+            files = {"file": (f"bench_upload_{n}.docx", self.upload_blob,
+                              "application/vnd.openxmlformats-officedocument.wordprocessingml.document")}
+            return "POST", "/upload", {"files": files}
+        raise ValueError(f"Unknown endpoint {endpoint}")
+
+
+async def drive(base_url, workload, endpoint, total, concurrency, timeout):
+    latencies, errors, statuses = [], 0, {}
+    counter = iter(range(total))
+    lock = asyncio.Lock()
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout) as client:
+        async def worker():
+            nonlocal errors
+            while True:
+                async with lock:
+                    n = next(counter, None)
+                if n is None:
+                    return
+                method, path, kwargs = workload.request(endpoint, n)
+                start = time.perf_counter()
+                try:
+                    resp = await client.request(method, path, **kwargs)
+                    await resp.aread()
+                    status = resp.status_code
+                except httpx.HTTPError as e:
+                    status = type(e).__name__
+                elapsed = time.perf_counter() - start
+                statuses[str(status)] = statuses.get(str(status), 0) + 1
+                if isinstance(status, int) and status < 400:
+                    latencies.append(elapsed)
+                else:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        wall = time.perf_counter() - started
+
+    ms = [v * 1000 for v in latencies]
+    return {
+        "requests": total,
+        "concurrency": concurrency,
+        "ok": len(latencies),
+        "errors": errors,
+        "status_counts": statuses,
+        "wall_seconds": round(wall, 3),
+        "throughput_rps": round(len(latencies) / wall, 3) if wall else None,
+        "latency_ms": {
+            "mean": round(sum(ms) / len(ms), 2) if ms else None,
+            "p50": round(percentile(ms, 50), 2) if ms else None,
+            "p95": round(percentile(ms, 95), 2) if ms else None,
+            "p99": round(percentile(ms, 99), 2) if ms else None,
+            "max": round(max(ms), 2) if ms else None,
+        },
+    }
+
+
+def prepare_workspace(workspace, args):
+    docs_dir = os.path.join(workspace, "documents")
+    os.makedirs(os.path.join(workspace, "uploaded_docs"), exist_ok=True)
+    doc_names = corpus.generate_corpus(
+        docs_dir, docs=args.docs, seed=args.seed,
+        sections=args.sections, steps_per_section=args.steps_per_section,
+    )
+    db_path = os.path.join(workspace, "bench.sqlite3")
+    emails = sqlite_db.create_database(db_path, users=args.users, seed=args.seed)
+    return doc_names, emails, db_path
+
+
+def start_server(workspace, db_path, ollama_url, port, log_path):
+    env = dict(os.environ)
+    env.update({
+        "G2G_BENCH_DB": db_path,
+        "OLLAMA_HOST": ollama_url,
+        "PYTHONPATH": os.pathsep.join(filter(None, [REPO_ROOT, env.get("PYTHONPATH")])),
+    })
+    env.pop("DOCUMENTS_FOLDER", None)
+    log = open(log_path, "w")
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "bench.serve", "--port", str(port)],
+        cwd=workspace, env=env, stdout=log, stderr=subprocess.STDOUT,
+    )
+    return proc, log
+
+
+def wait_ready(base_url, proc, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"Server exited with code {proc.returncode} during startup")
+        try:
+            if httpx.get(f"{base_url}/test", timeout=2).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError("Server did not become ready in time")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS), help="comma-separated subset of " + ",".join(ENDPOINTS))
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=100, help="requests per endpoint")
+    parser.add_argument("--upload-requests", type=int, default=3, help="uploads re-ingest, so keep this small")
+    parser.add_argument("--warmup", type=int, default=5, help="unrecorded requests per endpoint")
+    parser.add_argument("--timeout", type=float, default=300.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--docs", type=int, default=5)
+    parser.add_argument("--sections", type=int, default=12)
+    parser.add_argument("--steps-per-section", type=int, default=8)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--ttft", type=float, default=0.5)
+    parser.add_argument("--tokens-per-sec", type=float, default=20.0)
+    parser.add_argument("--num-tokens", type=int, default=120)
+    parser.add_argument("--ollama-parallel", type=int, default=1)
+    parser.add_argument("--startup-timeout", type=float, default=600.0)
+    parser.add_argument("--workspace", help="reuse this directory instead of a temp dir")
+    parser.add_argument("--keep", action="store_true", help="keep the workspace afterwards")
+    parser.add_argument("--out", default="bench_results.json")
+    args = parser.parse_args()
+
+    endpoints = [e.strip() for e in args.endpoints.split(",") if e.strip()]
+    unknown = set(endpoints) - set(ENDPOINTS)
+    if unknown:
+        parser.error(f"unknown endpoints: {sorted(unknown)}")
+
+    workspace = args.workspace or tempfile.mkdtemp(prefix="g2g-bench-")
+    os.makedirs(workspace, exist_ok=True)
+    print(f"Workspace: {workspace}")
+    doc_names, emails, db_path = prepare_workspace(workspace, args)
+
+    stub, ollama_url = start_stub_ollama(
+        port=0, ttft=args.ttft, tokens_per_sec=args.tokens_per_sec,
+        num_tokens=args.num_tokens, parallel=args.ollama_parallel, seed=args.seed,
+    )
+    port = _free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    log_path = os.path.join(workspace, "server.log")
+
+    startup_started = time.perf_counter()
+    proc, log = start_server(workspace, db_path, ollama_url, port, log_path)
+    results = {}
+    try:
+        wait_ready(base_url, proc, args.startup_timeout)
+        startup_seconds = time.perf_counter() - startup_started
+        print(f"Server ready in {startup_seconds:.1f}s (log: {log_path})")
+
+        workload = Workload(workspace, doc_names, emails, db_path, args.seed)
+        sampler = RssSampler(proc.pid)
+        for endpoint in endpoints:
+            total = args.upload_requests if endpoint == "upload" else args.requests
+            if args.warmup and endpoint != "upload":
+                asyncio.run(drive(base_url, workload, endpoint, args.warmup, 1, args.timeout))
+            with sampler:
+                stats = asyncio.run(drive(base_url, workload, endpoint, total, args.concurrency, args.timeout))
+            stats.update(sampler.summary())
+            results[endpoint] = stats
+            lat = stats["latency_ms"]
+            print(f"{endpoint:12s} ok={stats['ok']:<5d} err={stats['errors']:<4d} "
+                  f"p50={lat['p50']}ms p95={lat['p95']}ms p99={lat['p99']}ms "
+                  f"rps={stats['throughput_rps']} rss_peak={stats['rss_mb_peak']}MB")
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+        log.close()
+        stub.shutdown()
+
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "startup_seconds": round(startup_seconds, 3),
+            "config": vars(args),
+        },
+        "results": results,
+    }
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.out}")
+
+    if not args.keep and not args.workspace:
+        shutil.rmtree(workspace, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
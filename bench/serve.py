@@ -0,0 +1,38 @@
+"""Run main:app against the benchmark stand-ins.
+
+Meant to be started by bench.run as a subprocess whose working directory is
+the benchmark workspace (documents/, uploaded_docs/, sql_chroma_db/ are
+relative paths in app.py/main.py). OLLAMA_HOST must point at the stub.
+
+    G2G_BENCH_DB=bench.sqlite3 OLLAMA_HOST=http://127.0.0.1:11500 \
+        python -m bench.serve --port 8100
+"""
+import argparse
+import functools
+import os
+
+import uvicorn
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--workers-threads", type=int, default=40, help="anyio worker thread limit")
+    args = parser.parse_args()
+
+    from bench import sqlite_db
+    import main as service
+
+    service._connect = functools.partial(sqlite_db.get_connection, os.environ["G2G_BENCH_DB"])
+
+    @service.app.on_event("startup")
+    async def _thread_limit():
+        import anyio.to_thread
+        anyio.to_thread.current_default_thread_limiter().total_tokens = args.workers_threads
+
+    uvicorn.run(service.app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
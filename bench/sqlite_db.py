@@ -0,0 +1,151 @@
+"""SQLite stand-in for the Azure SQL tables used by main.py.
+
+`get_connection(path)` returns a connection whose cursors look enough like
+pyodbc's (`?` parameters, `fetchval`, `SELECT @@IDENTITY`, datetime columns)
+that the endpoints in main.py run against it unchanged.
+"""
+import random
+import sqlite3
+import uuid
+from datetime import datetime, timedelta
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS USER_SETTINGS_TABLE (
+    ID INTEGER PRIMARY KEY AUTOINCREMENT,
+    USER_NAME TEXT,
+    EMAIL_ID TEXT,
+    CREATED_BY TEXT
+);
+CREATE INDEX IF NOT EXISTS IX_USER_SETTINGS_EMAIL ON USER_SETTINGS_TABLE (EMAIL_ID);
+
+CREATE TABLE IF NOT EXISTS USER_MESSAGES_TABLE (
+    ID INTEGER PRIMARY KEY AUTOINCREMENT,
+    USER_ID INTEGER,
+    SESSION_ID TEXT,
+    PROMPTS TEXT,
+    MESSAGE TEXT,
+    LINKS TEXT,
+    CREATE_DATE TIMESTAMP,
+    CREATED_BY INTEGER
+);
+CREATE INDEX IF NOT EXISTS IX_USER_MESSAGES_USER ON USER_MESSAGES_TABLE (USER_ID, SESSION_ID);
+
+CREATE TABLE IF NOT EXISTS USER_MESSAGES_IMAGE_TABLE (
+    ID INTEGER PRIMARY KEY AUTOINCREMENT,
+    MESSAGE_ID INTEGER,
+    IMAGE_ID TEXT,
+    CREATE_DATE TIMESTAMP,
+    CREATED_BY INTEGER
+);
+CREATE INDEX IF NOT EXISTS IX_USER_MESSAGES_IMAGE_MSG ON USER_MESSAGES_IMAGE_TABLE (MESSAGE_ID);
+
+CREATE TABLE IF NOT EXISTS CHAT_PROCESS_FLOW_TABLE (
+    ID INTEGER PRIMARY KEY AUTOINCREMENT,
+    CHAT_PROCESS_NAME TEXT,
+    CREATED_BY TEXT
+);
+"""
+
+sqlite3.register_adapter(datetime, lambda d: d.isoformat(sep=" "))
+sqlite3.register_converter("TIMESTAMP", lambda b: datetime.fromisoformat(b.decode()))
+
+
+class Cursor:
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, sql, params=()):
+        if sql.strip().upper() == "SELECT @@IDENTITY":
+            sql = "SELECT last_insert_rowid()"
+        self._cursor.execute(sql, params)
+        return self
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    def fetchval(self):
+        row = self._cursor.fetchone()
+        return row[0] if row else None
+
+    def close(self):
+        self._cursor.close()
+
+
+class Connection:
+    def __init__(self, path):
+        self._conn = sqlite3.connect(path, timeout=30, detect_types=sqlite3.PARSE_DECLTYPES)
+
+    def cursor(self):
+        return Cursor(self._conn.cursor())
+
+    def commit(self):
+        self._conn.commit()
+
+    def close(self):
+        self._conn.close()
+
+
+def get_connection(path):
+    return Connection(path)
+
+
+def create_database(path, users=50, sessions_per_user=6, messages_per_session=8,
+                    process_flows=("Leave Notification", "Onboarding", "Timesheet"), seed=0):
+    """Create the schema at `path` and seed it. Returns the seeded user emails."""
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path, detect_types=sqlite3.PARSE_DECLTYPES)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(SCHEMA)
+
+    conn.executemany(
+        "INSERT INTO CHAT_PROCESS_FLOW_TABLE (CHAT_PROCESS_NAME, CREATED_BY) VALUES (?, ?)",
+        [(name, "bench") for name in process_flows],
+    )
+
+    emails = []
+    start = datetime(2025, 1, 1)
+    for u in range(users):
+        email = f"user{u}@bench.local"
+        emails.append(email)
+        cur = conn.execute(
+            "INSERT INTO USER_SETTINGS_TABLE (USER_NAME, EMAIL_ID, CREATED_BY) VALUES (?, ?, ?)",
+            (f"user{u}", email, f"user{u}"),
+        )
+        user_id = cur.lastrowid
+        for s in range(sessions_per_user):
+            session_id = str(uuid.UUID(int=rng.getrandbits(128)))
+            created = start + timedelta(days=s, minutes=rng.randint(0, 600))
+            for m in range(messages_per_session):
+                sender = "user" if m % 2 == 0 else "bot"
+                text = f"{sender} message {m} in session {s}"
+                links = '["https://example.com/help"]' if sender == "bot" else "[]"
+                cur = conn.execute(
+                    "INSERT INTO USER_MESSAGES_TABLE "
+                    "(USER_ID, SESSION_ID, PROMPTS, MESSAGE, LINKS, CREATE_DATE, CREATED_BY) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (user_id, session_id, f"{sender}|{text}", text, links,
+                     created + timedelta(seconds=m * 30), user_id),
+                )
+                if sender == "bot":
+                    conn.execute(
+                        "INSERT INTO USER_MESSAGES_IMAGE_TABLE "
+                        "(MESSAGE_ID, IMAGE_ID, CREATE_DATE, CREATED_BY) VALUES (?, ?, ?, ?)",
+                        (cur.lastrowid, f"doc0.docx::img{m}_0", created, user_id),
+                    )
+    conn.commit()
+    conn.close()
+    return emails
+
+
+def session_ids(path, email):
+    conn = sqlite3.connect(path)
+    rows = conn.execute(
+        "SELECT DISTINCT m.SESSION_ID FROM USER_MESSAGES_TABLE m "
+        "JOIN USER_SETTINGS_TABLE u ON u.ID = m.USER_ID WHERE u.EMAIL_ID = ?",
+        (email,),
+    ).fetchall()
+    conn.close()
+    return [r[0] for r in rows]
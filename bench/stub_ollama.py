@@ -0,0 +1,156 @@
+"""Stub Ollama HTTP server for load testing.
+
+Speaks just enough of the Ollama API for ChatOllama (/api/chat, streamed
+NDJSON) and the /ask endpoint (/api/generate). Generation time is simulated
+from a time-to-first-token latency plus a fixed token rate, and at most
+`parallel` generations run at once (like OLLAMA_NUM_PARALLEL) so queueing
+under load behaves like a single CPU-bound Ollama instance.
+
+    python -m bench.stub_ollama --port 11434 --tokens-per-sec 20 --ttft 0.5
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+WORDS = (
+    "please raise a leave request in the portal and notify your supervisor "
+    "before the start date the approval is sent by email to the team lead"
+).split()
+
+
+class StubConfig:
+    def __init__(self, ttft=0.5, tokens_per_sec=20.0, num_tokens=120, parallel=1, seed=0):
+        self.ttft = ttft
+        self.tokens_per_sec = tokens_per_sec
+        self.num_tokens = num_tokens
+        self.slots = threading.BoundedSemaphore(max(1, parallel))
+        self.rng = random.Random(seed)
+        self.rng_lock = threading.Lock()
+        self.generations = 0
+
+    def tokens(self):
+        with self.rng_lock:
+            self.generations += 1
+            return [self.rng.choice(WORDS) + " " for _ in range(self.num_tokens)]
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat()
+
+
+class StubOllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    config: StubConfig = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _write_chunk(self, payload):
+        data = json.dumps(payload).encode() + b"\n"
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def do_GET(self):
+        if self.path == "/api/version":
+            return self._send_json({"version": "0.0.0-stub"})
+        if self.path == "/api/tags":
+            return self._send_json({"models": [{"name": "llama3.2:latest", "model": "llama3.2:latest"}]})
+        if self.path in ("/", "/api/ps"):
+            return self._send_json({"status": "ok", "generations": self.config.generations})
+        self._send_json({"error": "not found"}, status=404)
+
+    def do_POST(self):
+        if self.path not in ("/api/chat", "/api/generate"):
+            return self._send_json({"error": "not found"}, status=404)
+        body = self._read_json()
+        model = body.get("model", "llama3.2")
+        is_chat = self.path == "/api/chat"
+        stream = body.get("stream", True)
+        cfg = self.config
+
+        with cfg.slots:
+            started = time.perf_counter()
+            tokens = cfg.tokens()
+            time.sleep(cfg.ttft)
+            delay = 1.0 / cfg.tokens_per_sec if cfg.tokens_per_sec > 0 else 0.0
+
+            def piece(text, done):
+                msg = {"model": model, "created_at": _now(), "done": done}
+                if is_chat:
+                    msg["message"] = {"role": "assistant", "content": text}
+                else:
+                    msg["response"] = text
+                if done:
+                    msg.update({
+                        "done_reason": "stop",
+                        "total_duration": int((time.perf_counter() - started) * 1e9),
+                        "prompt_eval_count": 0,
+                        "eval_count": len(tokens),
+                    })
+                return msg
+
+            if not stream:
+                time.sleep(delay * len(tokens))
+                return self._send_json(piece("".join(tokens), True))
+
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for tok in tokens:
+                time.sleep(delay)
+                self._write_chunk(piece(tok, False))
+            self._write_chunk(piece("", True))
+            self.wfile.write(b"0\r\n\r\n")
+            self.wfile.flush()
+
+
+def start_stub_ollama(host="127.0.0.1", port=0, **config):
+    """Start the stub in a daemon thread. Returns (server, base_url)."""
+    handler = type("Handler", (StubOllamaHandler,), {"config": StubConfig(**config)})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--ttft", type=float, default=0.5, help="seconds before the first token")
+    parser.add_argument("--tokens-per-sec", type=float, default=20.0)
+    parser.add_argument("--num-tokens", type=int, default=120, help="tokens per response")
+    parser.add_argument("--parallel", type=int, default=1, help="concurrent generations")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    server, url = start_stub_ollama(
+        args.host, args.port, ttft=args.ttft, tokens_per_sec=args.tokens_per_sec,
+        num_tokens=args.num_tokens, parallel=args.parallel, seed=args.seed,
+    )
+    print(f"Stub Ollama listening on {url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from observability import record_cache
+
+logger = logging.getLogger(__name__)
+
+EMBED_CACHE_DIR = os.getenv("EMBED_CACHE_DIR", "./embedding_cache")
+KEY_SIZE = 20  # sha1 digest
+
+
+class CachedEmbeddings(Embeddings):
+    """Wraps an embedder with an on-disk cache of document vectors.
+
+    Vectors are keyed by sha1(model name + chunk text) and stored per model as
+    two append-only files: keys.bin (one 20-byte digest per row) and
+    vectors.f32 (row-major float32, memory-mapped for reads). Rebuilding the
+    collection therefore only embeds chunks whose text has never been seen.
+    Queries are not cached here. Appends are not safe across processes, so
+    only one process should ingest at a time.
+    """
+
+    def __init__(self, embedder, model_name, directory=EMBED_CACHE_DIR):
+        self.embedder = embedder
+        self.model_name = model_name
+        self.directory = os.path.join(directory, re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name))
+        self._keys_path = os.path.join(self.directory, "keys.bin")
+        self._vectors_path = os.path.join(self.directory, "vectors.f32")
+        self._meta_path = os.path.join(self.directory, "meta.json")
+        self._lock = threading.Lock()
+        self._index = {}
+        self._dim = None
+        self._vectors = None  # memmap over the first len(self._index) rows
+        os.makedirs(self.directory, exist_ok=True)
+        self._load()
+
+    def _load(self):
+        try:
+            self._load_files()
+        except Exception:
+            # The cache is an optimisation; never let it stop the service from starting.
+            logger.exception("Embedding cache in %s is unreadable; starting empty", self.directory)
+            self._reset()
+
+    def _reset(self):
+        for path in (self._meta_path, self._keys_path, self._vectors_path):
+            if os.path.exists(path):
+                os.remove(path)
+        self._index = {}
+        self._dim = None
+        self._vectors = None
+
+    def _load_files(self):
+        if not os.path.exists(self._meta_path):
+            # Nothing can be read without the dimension; drop any orphaned rows so
+            # new appends start row-aligned at zero.
+            self._reset()
+            return
+        with open(self._meta_path) as f:
+            self._dim = json.load(f)["dim"]
+        row_bytes = self._dim * 4
+        key_rows = os.path.getsize(self._keys_path) // KEY_SIZE if os.path.exists(self._keys_path) else 0
+        vector_rows = os.path.getsize(self._vectors_path) // row_bytes if os.path.exists(self._vectors_path) else 0
+        rows = min(key_rows, vector_rows)
+        # Trim any partially written tail so both files stay row-aligned.
+        for path, size in ((self._keys_path, rows * KEY_SIZE), (self._vectors_path, rows * row_bytes)):
+            if os.path.exists(path) and os.path.getsize(path) != size:
+                with open(path, "r+b") as f:
+                    f.truncate(size)
+        keys = b""
+        if rows:
+            with open(self._keys_path, "rb") as f:
+                keys = f.read()
+        self._index = {keys[i * KEY_SIZE:(i + 1) * KEY_SIZE]: i for i in range(rows)}
+        self._remap()
+        logger.info("Embedding cache loaded: %s vectors for %s", rows, self.model_name)
+
+    def _remap(self):
+        rows = len(self._index)
+        self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode="r", shape=(rows, self._dim)) if rows else None
+
+    def _key(self, text):
+        return hashlib.sha1(f"{self.model_name}\0{text}".encode()).digest()
+
+    def _append(self, keys, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if self._dim is None:
+            self._dim = int(vectors.shape[1])
+            with open(self._meta_path, "w") as f:
+                json.dump({"model": self.model_name, "dim": self._dim}, f)
+        # Vectors first: a key on disk must never point past the end of vectors.f32.
+        with open(self._vectors_path, "ab") as f:
+            f.write(vectors.tobytes())
+        with open(self._keys_path, "ab") as f:
+            f.write(b"".join(keys))
+        start = len(self._index)
+        for i, key in enumerate(keys):
+            self._index[key] = start + i
+        self._remap()
+
+    def embed_documents(self, texts):
+        keys = [self._key(t) for t in texts]
+        with self._lock:
+            rows = [self._index.get(k) for k in keys]
+        missing = {}
+        for key, text, row in zip(keys, texts, rows):
+            if row is None:
+                missing.setdefault(key, text)
+        hits = len(texts) - sum(r is None for r in rows)
+        record_cache("embedding", True, hits)
+        record_cache("embedding", False, len(texts) - hits)
+
+        if missing:
+            new_vectors = self.embedder.embed_documents(list(missing.values()))
+            with self._lock:
+                fresh = [(k, v) for k, v in zip(missing, new_vectors) if k not in self._index]
+                if fresh:
+                    self._append([k for k, _ in fresh], [v for _, v in fresh])
+                rows = [self._index[k] for k in keys]
+        with self._lock:
+            vectors = self._vectors
+        return vectors[rows].tolist() if rows else []
+
+    def embed_query(self, text):
+        return self.embedder.embed_query(text)
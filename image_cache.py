@@ -0,0 +1,119 @@
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from io import BytesIO
+
+from PIL import Image
+
+from observability import record_cache, timed
+
+logger = logging.getLogger(__name__)
+
+IMAGE_CACHE_DIR = os.getenv("IMAGE_CACHE_DIR", "./image_cache")
+IMAGE_CACHE_MAX_BYTES = int(os.getenv("IMAGE_CACHE_MAX_MB", "256")) * 1024 * 1024
+IMAGE_CACHE_MAX_AGE = int(os.getenv("IMAGE_CACHE_MAX_AGE", "3600"))
+
+# format query value -> (PIL format, media type, save options)
+IMAGE_FORMATS = {
+    "png": ("PNG", "image/png", {"optimize": True}),
+    "webp": ("WEBP", "image/webp", {"quality": 80, "method": 4}),
+    "jpeg": ("JPEG", "image/jpeg", {"quality": 85, "optimize": True, "progressive": True}),
+}
+
+
+def etag_matches(if_none_match, etag):
+    """True if an If-None-Match header value matches `etag` (weak comparison)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+def render_variant(img, width, fmt):
+    """Encode `img` as `fmt`, downscaled to `width` pixels wide if it is wider."""
+    pil_format, _, options = IMAGE_FORMATS[fmt]
+    if width and img.width > width:
+        height = max(1, round(img.height * width / img.width))
+        img = img.resize((width, height), Image.Resampling.LANCZOS)
+    if pil_format == "JPEG" and img.mode not in ("RGB", "L"):
+        img = img.convert("RGB")
+    buf = BytesIO()
+    with timed("image_encode"):
+        img.save(buf, format=pil_format, **options)
+    return buf.getvalue()
+
+
+class ImageVariantCache:
+    """Encoded image variants on disk, bounded by total size with LRU eviction.
+
+    Keys already include the source file's mtime and size, so a replaced
+    document never serves stale variants; old entries simply age out.
+    """
+
+    def __init__(self, directory=IMAGE_CACHE_DIR, max_bytes=IMAGE_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # file name -> size, least recently used first
+        self._total = 0
+        os.makedirs(directory, exist_ok=True)
+        files = []
+        for name in os.listdir(directory):
+            if name.endswith(".tmp"):
+                continue
+            st = os.stat(os.path.join(directory, name))
+            files.append((st.st_mtime, name, st.st_size))
+        for _, name, size in sorted(files):
+            self._entries[name] = size
+            self._total += size
+
+    @staticmethod
+    def key(source_path, image_id, width, fmt):
+        st = os.stat(source_path)
+        raw = f"{os.path.abspath(source_path)}|{st.st_mtime_ns}|{st.st_size}|{image_id}|{width}|{fmt}"
+        return hashlib.sha1(raw.encode()).hexdigest()
+
+    def get(self, key, fmt):
+        name = f"{key}.{fmt}"
+        with self._lock:
+            hit = name in self._entries
+            if hit:
+                self._entries.move_to_end(name)
+        record_cache("image_variant", hit)
+        if not hit:
+            return None
+        path = os.path.join(self.directory, name)
+        try:
+            os.utime(path)  # keeps LRU order across restarts
+        except FileNotFoundError:
+            with self._lock:
+                self._total -= self._entries.pop(name, 0)
+            return None
+        return path
+
+    def put(self, key, fmt, data):
+        name = f"{key}.{fmt}"
+        path = os.path.join(self.directory, name)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        evicted = []
+        with self._lock:
+            self._total += len(data) - self._entries.pop(name, 0)
+            self._entries[name] = len(data)
+            while self._total > self.max_bytes and len(self._entries) > 1:
+                old, size = self._entries.popitem(last=False)
+                self._total -= size
+                evicted.append(old)
+        for old in evicted:
+            try:
+                os.remove(os.path.join(self.directory, old))
+            except FileNotFoundError:
+                pass
+        if evicted:
+            logger.debug("Evicted %d image variants", len(evicted))
+        return path
@@ -0,0 +1,87 @@
+import os
+
+from docx import Document
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+# Runs inside ingest()'s process pool. Kept apart from app.py so worker processes
+# only import python-docx and the splitter, not the embedding model or Chroma.
+
+# Stored on every chunk; ingest() re-chunks documents indexed under an older schema.
+#   1 (implicit): one or more chunks per paragraph
+#   2: consecutive paragraphs merged per heading section
+#   3: adds the partition (process flow) the document belongs to
+CHUNK_SCHEMA_VERSION = 3
+CHUNK_TOKEN_BUDGET = int(os.getenv("CHUNK_TOKEN_BUDGET", "300"))
+CHARS_PER_TOKEN = 4  # rough estimate for English prose with bge tokenizers
+
+
+def _heading_level(para):
+    name = para.style.name if para.style is not None else ""
+    if name == "Title":
+        return 0
+    if name.startswith("Heading"):
+        level = name[len("Heading"):].strip()
+        return int(level) if level.isdigit() else 1
+    return None
+
+
+def parse_and_split(path, source, partition):
+    """Parse one .docx into section chunks as (text, metadata) pairs.
+
+    Consecutive paragraphs under the same heading are merged until the chunk
+    reaches CHUNK_TOKEN_BUDGET; each chunk is prefixed with its heading path
+    and records the paragraph range it covers in para_index..para_end, plus
+    the partition used to route queries.
+    Paragraph indices match extract_text_image_link_pairs(). Images are not
+    decoded since ingestion never uses them.
+    """
+    budget = CHUNK_TOKEN_BUDGET * CHARS_PER_TOKEN
+    splitter = RecursiveCharacterTextSplitter(chunk_size=budget, chunk_overlap=budget // 4)
+    chunks = []
+    headings = []  # (level, text) of the enclosing headings, outermost first
+    parts, first, last, size = [], None, None, 0
+
+    def emit(text, start, end):
+        prefix = " > ".join(h for _, h in headings)
+        chunks.append((
+            f"{prefix}\n{text}" if prefix else text,
+            {
+                "source": source,
+                "partition": partition,
+                "para_index": start,
+                "para_end": end,
+                "chunk_schema": CHUNK_SCHEMA_VERSION,
+            },
+        ))
+
+    def flush():
+        nonlocal parts, first, last, size
+        if parts:
+            emit("\n".join(parts), first, last)
+        parts, first, last, size = [], None, None, 0
+
+    for i, para in enumerate(Document(path).paragraphs):
+        para_text = para.text.strip()
+        level = _heading_level(para)
+        if level is not None and para_text:
+            flush()
+            while headings and headings[-1][0] >= level:
+                headings.pop()
+            headings.append((level, para_text))
+            continue
+        if len(para_text) < 5:
+            continue
+        if len(para_text) > budget:
+            flush()
+            for c in splitter.split_text(para_text):
+                emit(c, i, i)
+            continue
+        if parts and size + len(para_text) > budget:
+            flush()
+        if first is None:
+            first = i
+        parts.append(para_text)
+        last = i
+        size += len(para_text) + 1
+    flush()
+    return chunks
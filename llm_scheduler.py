@@ -0,0 +1,160 @@
+import math
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+from observability import LLM_ACTIVE, LLM_QUEUE_DEPTH, LLM_QUEUE_WAIT, LLM_REJECTED
+
+# Lower value is served first.
+PRIORITIES = {"chat": 0, "ask": 1, "suggest": 2}
+
+# Generations allowed at once; match Ollama's OLLAMA_NUM_PARALLEL.
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "1"))
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "32"))
+# Longest a request may wait for a slot before it is dropped, per class.
+LLM_QUEUE_DEADLINES = {
+    "chat": float(os.getenv("LLM_CHAT_DEADLINE", "60")),
+    "ask": float(os.getenv("LLM_ASK_DEADLINE", "60")),
+    "suggest": float(os.getenv("LLM_SUGGEST_DEADLINE", "5")),
+}
+
+
+class LLMBusy(Exception):
+    """Raised when a request cannot be admitted; maps to 429 with Retry-After."""
+
+    def __init__(self, reason, retry_after):
+        super().__init__(f"LLM busy: {reason}")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class _Ticket:
+    __slots__ = ("kind", "user", "deadline", "granted", "queued")
+
+    def __init__(self, kind, user, deadline):
+        self.kind = kind
+        self.user = user
+        self.deadline = deadline
+        self.granted = False
+        self.queued = True
+
+
+class LLMScheduler:
+    """Admission control in front of the single Ollama instance.
+
+    Classes are served in strict priority order (chat > ask > suggest); within
+    a class, users are served round-robin so one chatty client can't starve
+    the rest. The queue is bounded, and tickets that wait past their class
+    deadline are dropped rather than run for a client that has given up.
+    """
+
+    def __init__(self, max_concurrency=LLM_MAX_CONCURRENCY, max_queue=LLM_MAX_QUEUE, deadlines=None):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.deadlines = deadlines or LLM_QUEUE_DEADLINES
+        self._cond = threading.Condition()
+        self._active = 0
+        self._depth = 0
+        # priority -> user -> queued tickets; dict order is the round-robin order
+        self._queues = {p: OrderedDict() for p in sorted(set(PRIORITIES.values()))}
+        self._service_time = 5.0  # EWMA of generation seconds, for Retry-After
+
+    @contextmanager
+    def slot(self, kind, user, deadline=None):
+        """Hold one generation slot for the duration of the block.
+
+        `deadline` is an absolute time.monotonic() value; it defaults to the
+        class deadline counted from now.
+        """
+        self._acquire(kind, user or "anonymous", deadline)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self._release(time.monotonic() - started)
+
+    def retry_after(self):
+        with self._cond:
+            return self._retry_after()
+
+    def _retry_after(self):
+        return max(1, math.ceil((self._depth + 1) * self._service_time / self.max_concurrency))
+
+    def _acquire(self, kind, user, deadline):
+        enqueued = time.monotonic()
+        with self._cond:
+            if self._active < self.max_concurrency and self._depth == 0:
+                self._active += 1
+                LLM_ACTIVE.set(self._active)
+                LLM_QUEUE_WAIT.labels(kind).observe(0.0)
+                return
+            if self._depth >= self.max_queue:
+                LLM_REJECTED.labels(kind, "queue_full").inc()
+                raise LLMBusy("queue full", self._retry_after())
+
+            ticket = _Ticket(kind, user, deadline or enqueued + self.deadlines[kind])
+            self._queues[PRIORITIES[kind]].setdefault(user, deque()).append(ticket)
+            self._depth += 1
+            LLM_QUEUE_DEPTH.labels(kind).inc()
+
+            while not ticket.granted:
+                remaining = ticket.deadline - time.monotonic()
+                if remaining <= 0:
+                    if ticket.queued:
+                        self._unqueue(ticket)
+                    LLM_REJECTED.labels(kind, "deadline").inc()
+                    raise LLMBusy("deadline exceeded while queued", self._retry_after())
+                self._cond.wait(remaining)
+            LLM_QUEUE_WAIT.labels(kind).observe(time.monotonic() - enqueued)
+
+    def _release(self, service_time):
+        with self._cond:
+            self._active -= 1
+            self._service_time = 0.8 * self._service_time + 0.2 * service_time
+            self._dispatch()
+            LLM_ACTIVE.set(self._active)
+
+    def _unqueue(self, ticket):
+        users = self._queues[PRIORITIES[ticket.kind]]
+        queue = users[ticket.user]
+        queue.remove(ticket)
+        if not queue:
+            del users[ticket.user]
+        ticket.queued = False
+        self._depth -= 1
+        LLM_QUEUE_DEPTH.labels(ticket.kind).dec()
+
+    def _next_ticket(self):
+        now = time.monotonic()
+        for users in self._queues.values():
+            while users:
+                user, queue = next(iter(users.items()))
+                ticket = queue[0]
+                self._unqueue(ticket)
+                if queue:
+                    users.move_to_end(user)
+                if ticket.deadline > now:
+                    return ticket
+                # Expired: its waiter wakes up, sees it was never granted and gives up.
+        return None
+
+    def _dispatch(self):
+        granted = False
+        while self._active < self.max_concurrency:
+            ticket = self._next_ticket()
+            if ticket is None:
+                break
+            ticket.granted = True
+            self._active += 1
+            granted = True
+        if granted:
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {"active": self._active, "queued": self._depth, "service_time": self._service_time}
+
+
+llm_scheduler = LLMScheduler()
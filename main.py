@@ -1,28 +1,47 @@
 from fastapi import FastAPI, Query, HTTPException, UploadFile, File, Depends, Header, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse, JSONResponse
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, Response, FileResponse
 from pydantic import BaseModel
 from datetime import datetime, timezone
-from io import BytesIO
-from typing import List
-import requests, os, traceback
+from typing import List, Optional
+from PIL import Image
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout
+from functools import lru_cache
+import requests, os
+import contextvars
+import hashlib
+import tempfile
+import threading
 import uuid
 import json
 import shutil
 import re
+import time
+import logging
 import pyodbc
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 
 from langchain_core.prompts import PromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.runnables import Runnable
 from langchain_community.chat_models import ChatOllama
 
-from app import build_chain, extract_text_image_link_pairs, DOCUMENTS_FOLDER, ingest
+from app import build_chain, extract_text_image_link_pairs, document_path, DOCUMENTS_FOLDER, UPLOAD_DIR, OLLAMA_HOST, ingest, ingest_files, remove_documents, get_corpus_version, bump_corpus_version, normalize_query, cached_retrieve
+from observability import setup_logging, timed, current_endpoint, REQUEST_LATENCY, IN_FLIGHT, CHAT_FALLBACKS, COALESCED_REQUESTS, LLM_REJECTED
+from coalesce import SingleFlight
+from llm_scheduler import llm_scheduler, LLMBusy, LLM_MAX_CONCURRENCY, LLM_MAX_QUEUE, LLM_QUEUE_DEADLINES
+from query_cache import TTLCache
+from image_cache import ImageVariantCache, etag_matches, render_variant, IMAGE_FORMATS, IMAGE_CACHE_MAX_AGE
+from profiling import profiled, profile_request, start_profile_request, is_admin, list_profiles, get_profile, PROFILING_ENABLED
 
 import jwt
 from jwt import PyJWKClient
 
 # === INIT ===
+setup_logging()
+logger = logging.getLogger(__name__)
+
 app = FastAPI()
 
 app.add_middleware(
@@ -34,14 +53,102 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# === METRICS ===
+_ROUTE_PATHS = None
+
+@app.middleware("http")
+async def track_requests(request: Request, call_next):
+    global _ROUTE_PATHS
+    if _ROUTE_PATHS is None:
+        _ROUTE_PATHS = {getattr(r, "path", None) for r in app.routes}
+    # Unknown paths share one label so scanners can't blow up metric cardinality.
+    endpoint = request.url.path if request.url.path in _ROUTE_PATHS else "other"
+    token = current_endpoint.set(endpoint)
+    marker = start_profile_request(
+        endpoint, request.method, request.headers.get("X-Profile"), request.headers.get("X-Admin-Token")
+    )
+    profile_token = profile_request.set(marker)
+    IN_FLIGHT.labels(endpoint).inc()
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        if marker and "profile_id" in marker:
+            response.headers["X-Profile-Id"] = marker["profile_id"]
+        return response
+    finally:
+        IN_FLIGHT.labels(endpoint).dec()
+        REQUEST_LATENCY.labels(request.method, endpoint, str(status)).observe(time.perf_counter() - start)
+        profile_request.reset(profile_token)
+        current_endpoint.reset(token)
+
+@app.get("/metrics")
+def metrics():
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+@app.exception_handler(LLMBusy)
+async def llm_busy_handler(request: Request, exc: LLMBusy):
+    return JSONResponse(
+        status_code=429,
+        content={"error": "The assistant is busy, please retry shortly.", "reason": exc.reason},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+# === PROFILING ===
+def require_admin(x_admin_token: str = Header(None)):
+    if not PROFILING_ENABLED:
+        raise HTTPException(status_code=404, detail="Profiling is disabled")
+    if not is_admin(x_admin_token):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+@app.get("/admin/profiles", dependencies=[Depends(require_admin)])
+def admin_list_profiles():
+    return {"profiles": list_profiles()}
+
+@app.get("/admin/profiles/{profile_id}", dependencies=[Depends(require_admin)])
+def admin_get_profile(profile_id: str, format: str = Query("json", pattern="^(json|collapsed)$")):
+    profile = get_profile(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    if format == "collapsed":
+        # Folded stacks, loadable in speedscope or flamegraph.pl
+        return Response(
+            profile["collapsed"] + "\n",
+            media_type="text/plain",
+            headers={"Content-Disposition": f'attachment; filename="profile-{profile_id}.folded"'},
+        )
+    return JSONResponse(
+        {k: v for k, v in profile.items() if k != "collapsed"},
+        headers={"Content-Disposition": f'attachment; filename="profile-{profile_id}.json"'},
+    )
+
 TENANT_ID = "18bea863-348d-41f2-b82b-6162e1822bbb"
 AUDIENCE = "18bea863-348d-41f2-b82b-6162e1822bbb"
 #AUDIENCE = f"api://18bea863-348d-41f2-b82b-6162e1822bbb/user_impersonation"
 JWKS_URL = f"https://login.microsoftonline.com/6eb54db1-fc6e-4b0a-a00b-930182dca624/discovery/v2.0/keys"
 ISSUER = f"https://login.microsoftonline.com/6eb54db1-fc6e-4b0a-a00b-930182dca624/v2.0"
 
-UPLOAD_DIR = "./uploaded_docs"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
+MAX_UPLOAD_MB = int(os.getenv("MAX_UPLOAD_MB", "25"))
+MAX_UPLOAD_FILES = int(os.getenv("MAX_UPLOAD_FILES", "50"))
+UPLOAD_CHUNK_SIZE = 1 << 20
+# Whole /upload_batch request: every file at its cap plus room for multipart framing.
+MAX_BATCH_BODY_BYTES = (MAX_UPLOAD_FILES * MAX_UPLOAD_MB + 1) * 1024 * 1024
+
+@app.middleware("http")
+async def limit_batch_upload_size(request: Request, call_next):
+    # Starlette spools the whole multipart body before /upload_batch runs, so only
+    # a Content-Length check can refuse an oversized batch before it is received.
+    if request.method == "POST" and request.url.path == "/upload_batch":
+        length = request.headers.get("content-length")
+        if length is None:
+            return JSONResponse(status_code=411, content={"detail": "Content-Length required"})
+        if not length.isdigit() or int(length) > MAX_BATCH_BODY_BYTES:
+            return JSONResponse(
+                status_code=413,
+                content={"detail": f"Batch larger than {MAX_BATCH_BODY_BYTES // (1024 * 1024)} MB"},
+            )
+    return await call_next(request)
 
 chain, retriever, llm = build_chain()
 
@@ -75,7 +182,7 @@ class SessionFetchRequest(BaseModel):
     email: str
 
 # === DB CONNECTION ===
-def get_connection():
+def _connect():
     #print(pyodbc.drivers())
     return pyodbc.connect(
         "DRIVER={ODBC Driver 17 for SQL Server};"
@@ -85,6 +192,46 @@ def get_connection():
         "PWD=Innovation@123"
     )
 
+class _TimedCursor:
+    # Records execute/fetch time as the "db_query" stage; everything else passes through.
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, *args):
+        with timed("db_query"):
+            self._cursor.execute(*args)
+        return self
+
+    def fetchone(self):
+        with timed("db_query"):
+            return self._cursor.fetchone()
+
+    def fetchall(self):
+        with timed("db_query"):
+            return self._cursor.fetchall()
+
+    def fetchval(self):
+        with timed("db_query"):
+            return self._cursor.fetchval()
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+class _TimedConnection:
+    def __init__(self, conn):
+        self._conn = conn
+
+    def cursor(self):
+        return _TimedCursor(self._conn.cursor())
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+def get_connection():
+    with timed("db_connect"):
+        conn = _connect()
+    return _TimedConnection(conn)
+
 # === Checking app ===
 @app.get("/")
 @app.get("/test")
@@ -104,28 +251,35 @@ def validate_token(token: str):
         )
         return payload
     except Exception as e:
-        print("Token validation error:", e)  # Add this line for debugging
+        logger.warning("Token validation error: %s", e)
         raise HTTPException(status_code=401, detail="Invalid token")
 
 
 
+def _ollama_generate(prompt, user):
+    with llm_scheduler.slot("ask", user):
+        with timed("llm_generation"):
+            return requests.post(f"{OLLAMA_HOST}/api/generate", json={
+                "model": "llama3.2",
+                "prompt": prompt,
+                "stream": False
+            })
+
 @app.post("/ask")
 async def ask_ollama(request: Request):
     body = await request.json()
     prompt = body.get("prompt", "")
+    user = body.get("username") or (request.client.host if request.client else None)
 
-    response = requests.post("http://localhost:11434/api/generate", json={
-        "model": "llama3.2",
-        "prompt": prompt,
-        "stream": False
-    })
-    print("Ollama response status:", response.status_code)
-    print("Ollama response text:", response.text)
+    # Blocking HTTP call: keep it off the event loop.
+    response = await run_in_threadpool(_ollama_generate, prompt, user)
+    logger.debug("Ollama response status: %s", response.status_code)
+    logger.debug("Ollama response text: %s", response.text)
     response.raise_for_status()
     try:
         return response.json()
     except json.JSONDecodeError:
-        print("Ollama returned invalid JSON:", response.text)
+        logger.error("Ollama returned invalid JSON: %s", response.text)
         raise HTTPException(status_code=502, detail="Ollama returned invalid response")
 
 
@@ -147,14 +301,210 @@ def login(authorization: str = Header(...)):
 # === CHAT ===
 GREETINGS = re.compile(r"\b(hi|hello|hey|good morning|good afternoon|good evening|greetings)\b", re.I)
 
+chat_flight = SingleFlight("chat")
+
+CHAT_DEADLINE_SECONDS = float(os.getenv("CHAT_DEADLINE_SECONDS", "20"))
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "256"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "300"))
+# Holds LLM answers that finished after /chat had already returned a fallback.
+answer_cache = TTLCache("answer", ANSWER_CACHE_SIZE, ANSWER_CACHE_TTL)
+# Generations run here so /chat can stop waiting at its deadline while the answer
+# still completes. _start_generation never submits more than GENERATION_POOL_SIZE,
+# so nothing waits in the executor's own unbounded queue, out of the scheduler's sight.
+GENERATION_POOL_SIZE = LLM_MAX_CONCURRENCY + LLM_MAX_QUEUE
+generation_pool = ThreadPoolExecutor(max_workers=GENERATION_POOL_SIZE, thread_name_prefix="llm")
+
+def _generate(input_data, username, deadline):
+    with llm_scheduler.slot("chat", username, deadline):
+        with timed("llm_generation"):
+            return chain.invoke(input_data)
+
+class _PendingGeneration:
+    __slots__ = ("future", "assets", "done")
+
+    def __init__(self, future):
+        self.future = future
+        self.assets = None  # (image_ids, related_links) once a request fell back on it
+        self.done = False
+
+# Generations still queued or running, by answer cache key. A request that fell
+# back leaves its generation here, so a retry of the same question waits on it
+# instead of submitting a duplicate while Ollama is saturated.
+pending_generations = {}
+pending_lock = threading.Lock()
+
+def _start_generation(cache_key, input_data, username):
+    """Return the in-flight generation for this question, submitting one only if none exists."""
+    with pending_lock:
+        pending = pending_generations.get(cache_key)
+        if pending is not None:
+            COALESCED_REQUESTS.labels("chat_generation").inc()
+            return pending
+        if len(pending_generations) >= GENERATION_POOL_SIZE:
+            LLM_REJECTED.labels("chat", "generation_pool_full").inc()
+            raise LLMBusy("generation pool full", llm_scheduler.retry_after())
+        # The scheduler deadline counts from submission, not from when a pool thread
+        # picks the task up, so abandoned generations can't wait longer than a request would.
+        deadline = time.monotonic() + LLM_QUEUE_DEADLINES["chat"]
+        # copy_context keeps the request's endpoint label on the generation's stage timings
+        pending = _PendingGeneration(
+            generation_pool.submit(contextvars.copy_context().run, _generate, input_data, username, deadline)
+        )
+        pending_generations[cache_key] = pending
+    pending.future.add_done_callback(lambda _: _finish_generation(cache_key, pending))
+    return pending
+
+def _cache_late_answer(cache_key, pending):
+    future = pending.future
+    if not future.cancelled() and future.exception() is None:
+        image_ids, related_links = pending.assets
+        answer_cache.put(cache_key, {
+            "answer": future.result(),
+            "image_ids": image_ids,
+            "related_links": related_links,
+            "fallback": False,
+        })
+
+def _finish_generation(cache_key, pending):
+    with pending_lock:
+        pending.done = True
+        abandoned = pending.assets is not None
+    # Cache before unregistering, so a retry always finds one or the other.
+    if abandoned:
+        _cache_late_answer(cache_key, pending)
+    with pending_lock:
+        if pending_generations.get(cache_key) is pending:
+            del pending_generations[cache_key]
+
+def _abandon_generation(cache_key, pending, image_ids, related_links):
+    """Called when /chat fell back; the answer is cached when the generation finishes."""
+    with pending_lock:
+        pending.assets = (image_ids, related_links)
+        done = pending.done
+    if done:
+        # Finished between the timeout and here; _finish_generation didn't see the assets.
+        _cache_late_answer(cache_key, pending)
+
+def extractive_answer(docs, max_chunks=3, max_chars=600):
+    excerpts = []
+    seen = set()
+    for doc in docs:
+        text = doc.page_content.strip()
+        if not text or text in seen:
+            continue
+        seen.add(text)
+        excerpts.append(f"- {text[:max_chars].rstrip()}{'…' if len(text) > max_chars else ''}")
+        if len(excerpts) == max_chunks:
+            break
+    if not excerpts:
+        return "I'm taking longer than usual to answer. Please try again in a moment or reach out to Respective POCs."
+    return (
+        "I'm taking longer than usual to compose a full answer, so here are the most relevant "
+        "excerpts from the documents:\n\n" + "\n\n".join(excerpts)
+    )
+
+RELATED_WINDOW = 3  # paragraphs either side of the anchor paragraph
+RELATED_IMAGES_PER_CHUNK = int(os.getenv("RELATED_IMAGES_PER_CHUNK", "4"))
+
+def _anchor_paragraph(triplets, start, end, question):
+    """Paragraph in start..end sharing the most words with the question.
+
+    Section chunks can span dozens of paragraphs; anchoring the asset window
+    here keeps /chat from attaching every screenshot in the section.
+    """
+    words = set(re.findall(r"\w{3,}", question.lower()))
+    best, best_score = start, 0
+    for idx in range(max(start, 0), min(end, len(triplets) - 1) + 1):
+        score = len(words & set(re.findall(r"\w{3,}", triplets[idx][0].lower())))
+        if score > best_score:
+            best, best_score = idx, score
+    return best
+
+def answer_question(user_input, username, cache_key, deadline):
+    # Cached document retrieval
+    relevant_docs_sources = set()
+    unique_docs = []
+    with timed("retrieval"):
+        relevant_docs = cached_retrieve(retriever, user_input)
+    with timed("dedup"):
+        for doc in relevant_docs:
+            source = doc.metadata.get("source", "")
+            # Defensive: avoid adding bool or non-str types to set
+            if isinstance(source, str) and source and (not isinstance(source, bool)) and source not in relevant_docs_sources:
+                relevant_docs_sources.add(source)
+                unique_docs.append(doc)
+
+    logger.debug("Relevant document sources: %s", relevant_docs_sources)
+    input_data = {
+        "context": unique_docs,  # result of similarity_search or retriever
+        "input": user_input
+    }
+    pending = _start_generation(cache_key, input_data, username)
+
+    # Image/link processing (same as before), overlapping with generation
+    #relevant_docs = docs
+    image_ids = []
+    related_links = set()
+    seen_ids = set()
+
+    with timed("related_assets"):
+        for doc in unique_docs:
+            fname = doc.metadata.get("source")
+            para_idx = doc.metadata.get("para_index")
+            if fname is None or para_idx is None:
+                continue
+            try:
+                para_idx = int(para_idx)
+                # Section chunks cover para_index..para_end; older chunks are a single paragraph.
+                para_end = int(doc.metadata.get("para_end", para_idx))
+            except Exception:
+                continue
+            path = document_path(fname)
+            triplets = extract_text_image_link_pairs(path)
+            anchor = _anchor_paragraph(triplets, para_idx, para_end, user_input)
+            # Nearest paragraphs first, so the per-chunk image cap keeps the closest ones.
+            window = sorted(range(anchor - RELATED_WINDOW, anchor + RELATED_WINDOW + 1), key=lambda i: abs(i - anchor))
+            chunk_images = 0
+            for nearby_idx in window:
+                if 0 <= nearby_idx < len(triplets):
+                    _, imgs, links = triplets[nearby_idx]
+                    for i, img in enumerate(imgs):
+                        img_id = f"{fname}::img{nearby_idx}_{i}"
+                        if img_id not in seen_ids and chunk_images < RELATED_IMAGES_PER_CHUNK:
+                            image_ids.append(img_id)
+                            seen_ids.add(img_id)
+                            chunk_images += 1
+                    related_links.update(links)
+
+    try:
+        answer = pending.future.result(timeout=max(0.0, deadline - time.monotonic()))
+    except FuturesTimeout:
+        CHAT_FALLBACKS.inc()
+        logger.warning("LLM missed the %ss /chat deadline; returning extractive answer", CHAT_DEADLINE_SECONDS)
+        _abandon_generation(cache_key, pending, image_ids, list(related_links))
+        return {
+            "answer": extractive_answer(relevant_docs),
+            "image_ids": image_ids,
+            "related_links": list(related_links),
+            "fallback": True,
+        }
+
+    # ✅ Now return all together
+    return {
+        "answer":  answer,
+        "image_ids": image_ids,
+        "related_links": list(related_links),
+        "fallback": False,
+    }
+
 @app.post("/chat")
+@profiled
 def chat(req: QueryRequest):
     
     try:
         user_input = req.question.strip()
         username = req.username
-        print("Input schema:", chain.input_schema.schema())
-        print("User input:", user_input)
+        logger.debug("User input: %s", user_input)
         # If greeting or empty, return process flows only
         if not user_input or GREETINGS.search(user_input):
             # Fetch process flows from DB or API
@@ -167,64 +517,18 @@ def chat(req: QueryRequest):
                 "related_links": []
             }
         else:
-            # Cached document retrieval
-            relevant_docs_sources = set()
-            unique_docs = []
-            relevant_docs = retriever.invoke(user_input)
-            #print(relevant_docs)  # Print retrieved documents for debugging
-            for doc in relevant_docs:
-                #print(doc.page_content)
-                source = doc.metadata.get("source", "")
-                # Defensive: avoid adding bool or non-str types to set
-                if isinstance(source, str) and source and (not isinstance(source, bool)) and source not in relevant_docs_sources:
-                    relevant_docs_sources.add(source)
-                    unique_docs.append(doc)
-
-            print("Relevant document sources:", relevant_docs_sources)
-            input_data = {
-                "input_documents": unique_docs,  # result of similarity_search or retriever
-                "input": user_input
-            }
-
-            result = chain.invoke(input_data)
-
-            # Image/link processing (same as before)
-            #relevant_docs = docs
-            image_ids = []
-            related_links = set()
-            seen_ids = set()
-
-            for doc in unique_docs:
-                fname = doc.metadata.get("source")
-                para_idx = doc.metadata.get("para_index")
-                if fname is None or para_idx is None:
-                    continue
-                try:
-                    para_idx = int(para_idx)
-                except Exception:
-                    continue
-                path = os.path.join(DOCUMENTS_FOLDER, fname)
-                triplets = extract_text_image_link_pairs(path)
-                for offset in range(-3, 4):
-                    nearby_idx = para_idx + offset
-                    if 0 <= nearby_idx < len(triplets):
-                        _, imgs, links = triplets[nearby_idx]
-                        for i, img in enumerate(imgs):
-                            img_id = f"{fname}::img{nearby_idx}_{i}"
-                            if img_id not in seen_ids:
-                                image_ids.append(img_id)
-                                seen_ids.add(img_id)
-                        related_links.update(links)
-
-            # ✅ Now return all together
-            return {
-                "answer":  result["answer"],
-                "image_ids": image_ids,
-                "related_links": list(related_links)
-            }
-
+            deadline = time.monotonic() + CHAT_DEADLINE_SECONDS
+            key = (normalize_query(user_input), get_corpus_version())
+            cached = answer_cache.get(key)
+            if cached is not None:
+                return cached
+            # Identical questions asked while one is being answered share that answer.
+            return chat_flight.do(key, answer_question, user_input, username, key, deadline)
+
+    except LLMBusy:
+        raise
     except Exception as e:
-        traceback.print_exc()
+        logger.exception("Error in /chat")
         return JSONResponse(status_code=500, content={"error": str(e)})
     
 
@@ -307,11 +611,11 @@ def save_message(msg: MessageSaveRequest):
             ))
 
         conn.commit()
-        print("✅ Message and associated images saved")
+        logger.info("✅ Message and associated images saved")
         return {"status": "saved"}
 
     except Exception as e:
-        print("❌ Error in /save_message:", e)
+        logger.error("❌ Error in /save_message: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
     finally:
@@ -382,7 +686,7 @@ def get_session(req: SessionFetchRequest):
         return {"messages": messages, "session_id": req.session_id}
 
     except Exception as e:
-        print("❌ Exception in /get_session:", e)
+        logger.error("❌ Exception in /get_session: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
     finally:
@@ -440,8 +744,30 @@ def get_history(email: str = Query(...)):
 
 
 # === IMAGE ENDPOINT ===
+RAW_IMAGE_EXTS = [".png", ".jpg", ".jpeg", ".gif"]
+image_cache = ImageVariantCache()
+
+def _load_image(path, ext, para_idx, img_idx):
+    if ext == ".docx":
+        triplets = extract_text_image_link_pairs(path)
+        if para_idx < len(triplets):
+            _, imgs, _ = triplets[para_idx]
+            if img_idx < len(imgs):
+                return imgs[img_idx]
+        return None
+    # Load fully and close the file; the returned image outlives this call.
+    with Image.open(path) as img:
+        img.load()
+    return img
+
 @app.get("/image")
-def get_image(image_id: str = Query(...)):
+@profiled
+def get_image(
+    request: Request,
+    image_id: str = Query(...),
+    w: Optional[int] = Query(None, ge=16, le=4096),
+    format: Optional[str] = Query(None, pattern="^(png|webp|jpeg)$"),
+):
     try:
         fname, img_info = image_id.split("::img")
         para_idx, img_idx = map(int, img_info.split("_"))
@@ -450,26 +776,42 @@ def get_image(image_id: str = Query(...)):
             if not os.path.exists(path):
                 continue
             ext = os.path.splitext(fname)[1].lower()
-            if ext == ".docx":
-                triplets = extract_text_image_link_pairs(path)
-                if para_idx < len(triplets):
-                    _, imgs, _ = triplets[para_idx]
-                    if img_idx < len(imgs):
-                        buf = BytesIO()
-                        imgs[img_idx].save(buf, format="PNG")
-                        buf.seek(0)
-                        return StreamingResponse(buf, media_type="image/png")
-            elif ext in [".png", ".jpg", ".jpeg", ".gif"] and para_idx == 0 and img_idx == 0:
-                return StreamingResponse(open(path, "rb"), media_type=f"image/{ext.strip('.')}")
+            if ext != ".docx" and not (ext in RAW_IMAGE_EXTS and para_idx == 0 and img_idx == 0):
+                continue
+            # Uploaded image files are served untouched unless a variant is requested;
+            # images embedded in .docx default to full-size PNG.
+            raw_original = ext != ".docx" and w is None and format is None
+            fmt = format or "png"
+            key = ImageVariantCache.key(path, image_id, w, "original" if raw_original else fmt)
+            headers = {"ETag": f'"{key}"', "Cache-Control": f"public, max-age={IMAGE_CACHE_MAX_AGE}"}
+            if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+                return Response(status_code=304, headers=headers)
+            if raw_original:
+                return FileResponse(path, media_type=f"image/{ext.strip('.')}", headers=headers)
+
+            media_type = IMAGE_FORMATS[fmt][1]
+            cached_path = image_cache.get(key, fmt)
+            if cached_path:
+                return FileResponse(cached_path, media_type=media_type, headers=headers)
+            img = _load_image(path, ext, para_idx, img_idx)
+            if img is None:
+                continue
+            data = render_variant(img, w, fmt)
+            image_cache.put(key, fmt, data)
+            return Response(content=data, media_type=media_type, headers=headers)
         raise HTTPException(status_code=404, detail="Image not found")
+    except HTTPException:
+        raise
     except Exception as e:
+        logger.exception("Error serving image %s", image_id)
         raise HTTPException(status_code=500, detail="Internal server error")
 
 # === LINKS ENDPOINT ===
 @app.get("/links")
+@profiled
 def get_links(file: str = Query(...), idx: int = Query(...)):
     try:
-        path = os.path.join(DOCUMENTS_FOLDER, file)
+        path = document_path(file)
         triplets = extract_text_image_link_pairs(path)
         if idx >= len(triplets):
             raise HTTPException(status_code=404, detail="Index out of bounds")
@@ -496,9 +838,12 @@ async def upload_file(file: UploadFile = File(...)):
             image_ids.append(f"{file.filename}::img0_0")
         else:
             raise HTTPException(status_code=400, detail="Unsupported file type")
-        ingest()
+        with timed("ingest"):
+            ingest()
         global chain, retriever, llm
-        chain, retriever, llm = build_chain()
+        with timed("build_chain"):
+            chain, retriever, llm = build_chain()
+            bump_corpus_version()
         return {
             "filename": file.filename,
             "message": "File uploaded successfully",
@@ -507,6 +852,178 @@ async def upload_file(file: UploadFile = File(...)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
 
+# Serializes re-indexing so concurrent batches don't interleave Chroma writes
+# or swap in a chain built from a half-indexed corpus.
+index_lock = threading.Lock()
+
+@lru_cache(maxsize=4096)
+def _file_sha256(path, size, mtime_ns):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(UPLOAD_CHUNK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _known_hashes():
+    """sha256 -> file name for every bundled and uploaded document."""
+    known = {}
+    for folder in [DOCUMENTS_FOLDER, UPLOAD_DIR]:
+        for entry in os.scandir(folder):
+            if entry.is_file() and not entry.name.startswith("."):
+                st = entry.stat()
+                known[_file_sha256(entry.path, st.st_size, st.st_mtime_ns)] = entry.name
+    return known
+
+async def _stream_to_temp(file):
+    """Copy a received upload to a hidden temp file in UPLOAD_DIR, hashing as it goes.
+
+    Starlette has already spooled the upload by the time this runs, so
+    MAX_UPLOAD_MB only keeps oversized files out of UPLOAD_DIR; the bytes on
+    the wire are bounded by limit_batch_upload_size. Returns (temp path,
+    sha256), or (None, reason) once MAX_UPLOAD_MB is exceeded.
+    """
+    limit = MAX_UPLOAD_MB * 1024 * 1024
+    digest = hashlib.sha256()
+    size = 0
+    tmp = tempfile.NamedTemporaryFile(dir=UPLOAD_DIR, prefix=".upload-", delete=False)
+    try:
+        with tmp:
+            while block := await file.read(UPLOAD_CHUNK_SIZE):
+                size += len(block)
+                if size > limit:
+                    break
+                digest.update(block)
+                tmp.write(block)
+    except BaseException:
+        os.remove(tmp.name)
+        raise
+    if size > limit:
+        os.remove(tmp.name)
+        return None, f"larger than {MAX_UPLOAD_MB} MB"
+    return tmp.name, digest.hexdigest()
+
+def _rollback_batch(paths, backups):
+    """Undo a batch whose indexing failed, so a retry isn't rejected as a duplicate of itself.
+
+    The batch's files and chunks are removed and any uploads it replaced are
+    restored and re-indexed.
+    """
+    global chain, retriever, llm
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+    for path, backup in backups.items():
+        if os.path.exists(backup):
+            os.replace(backup, path)
+    if not any(p.endswith(".docx") for p in paths):
+        return
+    try:
+        with index_lock:
+            remove_documents([os.path.basename(p) for p in paths])
+            ingest_files(list(backups))
+            chain, retriever, llm = build_chain()
+    except Exception:
+        logger.exception("Could not restore the index after a failed batch upload")
+    # Chunks may already have been removed even if the rebuild failed.
+    bump_corpus_version()
+
+def _image_ids(fname, path):
+    ext = os.path.splitext(fname)[1].lower()
+    if ext != ".docx":
+        return [f"{fname}::img0_0"]
+    return [
+        f"{fname}::img{para_idx}_{img_idx}"
+        for para_idx, (_, imgs, _) in enumerate(extract_text_image_link_pairs(path))
+        for img_idx, _ in enumerate(imgs)
+    ]
+
+@app.post("/upload_batch")
+async def upload_batch(files: List[UploadFile] = File(...)):
+    """Upload several documents/images and index them in a single pass.
+
+    The request as a whole is capped by Content-Length before it is read;
+    once received, files over MAX_UPLOAD_MB or whose content is already
+    known (or repeated within the batch) are rejected. All
+    accepted .docx files are then ingested together and the chain is rebuilt
+    once, instead of once per file as with /upload.
+    """
+    if len(files) > MAX_UPLOAD_FILES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_UPLOAD_FILES} files per batch")
+    known = await run_in_threadpool(_known_hashes)
+    accepted, rejected = [], []
+    try:
+        for file in files:
+            fname = os.path.basename(file.filename or "")
+            ext = os.path.splitext(fname)[1].lower()
+            if ext not in [".docx", ".png", ".jpg", ".jpeg", ".gif"]:
+                rejected.append({"filename": file.filename, "reason": "unsupported file type"})
+                continue
+            if any(a["filename"] == fname for a in accepted):
+                rejected.append({"filename": fname, "reason": "duplicate file name in batch"})
+                continue
+            if os.path.exists(os.path.join(DOCUMENTS_FOLDER, fname)):
+                rejected.append({"filename": fname, "reason": "name used by a bundled document"})
+                continue
+            tmp_path, sha256 = await _stream_to_temp(file)
+            if tmp_path is None:
+                rejected.append({"filename": fname, "reason": sha256})
+                continue
+            if sha256 in known:
+                os.remove(tmp_path)
+                rejected.append({"filename": fname, "reason": f"duplicate of {known[sha256]}"})
+                continue
+            known[sha256] = fname
+            accepted.append({"filename": fname, "sha256": sha256, "tmp_path": tmp_path})
+    except Exception:
+        for a in accepted:
+            os.remove(a["tmp_path"])
+        raise
+
+    def index_batch():
+        global chain, retriever, llm
+        paths, backups = [], {}
+        try:
+            for a in accepted:
+                path = os.path.join(UPLOAD_DIR, a["filename"])
+                if os.path.exists(path):
+                    # Keep the upload being replaced until the new one is indexed.
+                    backups[path] = os.path.join(UPLOAD_DIR, f".{a['filename']}.prev")
+                    os.replace(path, backups[path])
+                os.replace(a.pop("tmp_path"), path)
+                paths.append(path)
+            # Images are served straight from UPLOAD_DIR; only documents need
+            # indexing, and a rebuild rescans every stored embedding.
+            docx_paths = [p for p in paths if p.endswith(".docx")]
+            if docx_paths:
+                with index_lock:
+                    with timed("ingest"):
+                        ingest_files(docx_paths)
+                    with timed("build_chain"):
+                        chain, retriever, llm = build_chain()
+                        bump_corpus_version()
+        except Exception:
+            _rollback_batch(paths, backups)
+            raise
+        for backup in backups.values():
+            os.remove(backup)
+        for a, path in zip(accepted, paths):
+            a["image_ids"] = _image_ids(a["filename"], path)
+
+    if accepted:
+        try:
+            await run_in_threadpool(index_batch)
+        except Exception as e:
+            logger.exception("Batch indexing failed")
+            for a in accepted:
+                if "tmp_path" in a and os.path.exists(a["tmp_path"]):
+                    os.remove(a["tmp_path"])
+            raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
+    return {
+        "message": f"{len(accepted)} file(s) uploaded, {len(rejected)} rejected",
+        "uploaded": accepted,
+        "rejected": rejected,
+    }
+
 # === FEEDBACK ===
 FEEDBACK_FILE = "feedback_log.json"
 
@@ -533,14 +1050,19 @@ suggestion_prompt = PromptTemplate.from_template(
 suggest_chain: Runnable = suggestion_prompt | llm | StrOutputParser()
 
 @app.get("/suggest", response_model=List[str])
-def get_suggestions(q: str = Query(..., min_length=2)):
+@profiled
+def get_suggestions(request: Request, q: str = Query(..., min_length=2)):
     try:
-        retriever.search_kwargs.update({"k": 2})
-        docs = retriever.invoke(q)
+        # Own retriever with k=2; updating the shared one in place also changed /chat's k.
+        suggest_retriever = retriever.model_copy(update={"search_kwargs": {**retriever.search_kwargs, "k": 2}})
+        with timed("retrieval"):
+            docs = cached_retrieve(suggest_retriever, q)
         if not docs:
             return ["What is this document about?", "Can you summarize this?", "Is this relevant to my query?"]
         context_text = "\n\n".join(doc.page_content[:500] for doc in docs)[:2000]
-        raw_output = suggest_chain.invoke({"context": context_text})
+        with llm_scheduler.slot("suggest", request.client.host if request.client else None):
+            with timed("llm_generation"):
+                raw_output = suggest_chain.invoke({"context": context_text})
         lines = raw_output.strip().splitlines()
         suggestions = [
             re.sub(r"^\d+[\.\)]\s*", "", line.strip("-•").strip())
@@ -554,6 +1076,8 @@ def get_suggestions(q: str = Query(..., min_length=2)):
                 if len(s.strip()) > 5
             ][:3]
         return suggestions[:3]
+    except LLMBusy:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail="Failed to generate suggestions")
 
@@ -599,7 +1123,7 @@ def getChatProcessFlow():
         chat_process_list = [row[0] for row in chat_process_flows]
         if not chat_process_list:
             raise HTTPException(status_code=404, detail="No chat process flows found")
-        print(f"Chat process flows found: {chat_process_list}")
+        logger.debug("Chat process flows found: %s", chat_process_list)
         return {"chat_process_flows": chat_process_list}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,104 @@
+import logging
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from prometheus_client import Counter, Gauge, Histogram
+
+# === LOGGING ===
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()  # "text" or "json"
+_logging_configured = False
+
+
+def setup_logging():
+    global _logging_configured
+    if _logging_configured:
+        return
+    root = logging.getLogger()
+    handler = logging.StreamHandler()
+    if LOG_FORMAT == "json":
+        from pythonjsonlogger.json import JsonFormatter
+        handler.setFormatter(JsonFormatter("%(asctime)s %(levelname)s %(name)s %(message)s"))
+    else:
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    root.addHandler(handler)
+    root.setLevel(LOG_LEVEL)
+    _logging_configured = True
+
+
+# === METRICS ===
+# Endpoint the current request is serving; set by the HTTP middleware in main.py
+# so stage timings recorded deep in helpers (docx parsing, DB calls) are attributed
+# to the route that triggered them.
+current_endpoint: ContextVar[str] = ContextVar("current_endpoint", default="none")
+
+REQUEST_LATENCY = Histogram(
+    "g2g_request_duration_seconds",
+    "End-to-end HTTP request latency",
+    ["method", "endpoint", "status"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120),
+)
+STAGE_LATENCY = Histogram(
+    "g2g_stage_duration_seconds",
+    "Latency of individual stages inside a request",
+    ["endpoint", "stage"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120),
+)
+IN_FLIGHT = Gauge(
+    "g2g_requests_in_flight",
+    "Requests currently being served",
+    ["endpoint"],
+)
+CACHE_REQUESTS = Counter(
+    "g2g_cache_requests_total",
+    "Cache lookups by cache name and result (hit/miss)",
+    ["cache", "result"],
+)
+
+COALESCED_REQUESTS = Counter(
+    "g2g_coalesced_requests_total",
+    "Requests that attached to an identical in-flight computation instead of running their own",
+    ["flight"],
+)
+
+LLM_QUEUE_DEPTH = Gauge(
+    "g2g_llm_queue_depth",
+    "Requests waiting for an LLM slot",
+    ["priority"],
+)
+LLM_QUEUE_WAIT = Histogram(
+    "g2g_llm_queue_wait_seconds",
+    "Time spent waiting for an LLM slot",
+    ["priority"],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120),
+)
+LLM_ACTIVE = Gauge(
+    "g2g_llm_active",
+    "LLM generations currently running",
+)
+LLM_REJECTED = Counter(
+    "g2g_llm_rejected_total",
+    "Requests refused by the LLM scheduler",
+    ["priority", "reason"],
+)
+
+CHAT_FALLBACKS = Counter(
+    "g2g_chat_fallbacks_total",
+    "/chat responses answered extractively because the LLM missed the deadline",
+)
+
+
+@contextmanager
+def timed(stage):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_LATENCY.labels(current_endpoint.get(), stage).observe(time.perf_counter() - start)
+
+
+def record_cache(cache, hit, count=1):
+    if count:
+        CACHE_REQUESTS.labels(cache, "hit" if hit else "miss").inc(count)
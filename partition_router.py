@@ -0,0 +1,151 @@
+import logging
+import os
+import re
+from typing import Any, Dict, List
+
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.vectorstores.utils import maximal_marginal_relevance
+from pydantic import ConfigDict, Field
+
+logger = logging.getLogger(__name__)
+
+ROUTER_TOP_N = int(os.getenv("ROUTER_TOP_N", "2"))
+ROUTER_KEYWORD_BOOST = float(os.getenv("ROUTER_KEYWORD_BOOST", "0.1"))
+
+_STOPWORDS = {"and", "the", "for", "with", "how", "what", "guide", "user", "process", "docx", "from", "your"}
+
+
+def partition_slug(text):
+    # Kept short enough for "<collection>__<slug>" to fit Chroma's 63-char name limit.
+    return re.sub(r"[^a-z0-9]+", "-", text.lower())[:48].strip("-") or "default"
+
+
+def keywords(text):
+    return {w for w in re.findall(r"[a-z0-9]+", text.lower()) if len(w) > 2 and w not in _STOPWORDS}
+
+
+def scan_partitions(stores, page_size=1000):
+    """Read every chunk once and summarise the partitions found.
+
+    Returns (partition -> store holding it, partition -> unit centroid,
+    partition -> keyword set, partition -> chunk count). Stores are paged
+    through `page_size` chunks at a time.
+    """
+    homes, sums, counts, words = {}, {}, {}, {}
+    for store in stores:
+        offset = 0
+        while True:
+            page = store.get(include=["embeddings", "metadatas"], limit=page_size, offset=offset)
+            metadatas = page["metadatas"]
+            if not metadatas:
+                break
+            for vector, meta in zip(page["embeddings"], metadatas):
+                partition = meta.get("partition")
+                if not partition:
+                    continue
+                homes[partition] = store
+                vector = np.asarray(vector, dtype=np.float32)
+                sums[partition] = sums.get(partition, 0) + vector
+                counts[partition] = counts.get(partition, 0) + 1
+                words.setdefault(partition, keywords(partition)).update(keywords(meta.get("source", "")))
+            offset += len(metadatas)
+    centroids = {}
+    for partition, total in sums.items():
+        centroid = total / counts[partition]
+        norm = np.linalg.norm(centroid)
+        centroids[partition] = centroid / norm if norm else centroid
+    return homes, centroids, words, counts
+
+
+class PartitionRouter:
+    """Picks the partitions most likely to answer a query.
+
+    Score = cosine(query, partition centroid) + ROUTER_KEYWORD_BOOST per query
+    word that appears in the partition's name or source file names.
+    """
+
+    def __init__(self, centroids, words, top_n=ROUTER_TOP_N, keyword_boost=ROUTER_KEYWORD_BOOST):
+        self.partitions = sorted(centroids)
+        self.matrix = np.stack([centroids[p] for p in self.partitions]) if centroids else None
+        self.words = words
+        self.top_n = top_n
+        self.keyword_boost = keyword_boost
+
+    def route(self, query, query_embedding):
+        if len(self.partitions) <= self.top_n:
+            return list(self.partitions)
+        q = np.asarray(query_embedding, dtype=np.float32)
+        q = q / (np.linalg.norm(q) or 1.0)
+        scores = self.matrix @ q
+        query_words = keywords(query)
+        for i, partition in enumerate(self.partitions):
+            scores[i] += self.keyword_boost * len(query_words & self.words.get(partition, set()))
+        best = np.argsort(-scores)[: self.top_n]
+        return [self.partitions[i] for i in best]
+
+
+class PartitionedRetriever(BaseRetriever):
+    """MMR retrieval restricted to the partitions chosen by a PartitionRouter.
+
+    `partition_stores` maps each partition to the Chroma store holding it:
+    one store per partition when collections are sharded, otherwise the same
+    store for all of them (searched with a partition metadata filter).
+    Candidates from every routed partition are merged before MMR, so results
+    match a single-collection search over just those partitions.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    partition_stores: Dict[str, Any]
+    router: PartitionRouter
+    embeddings: Any
+    search_type: str = "mmr"
+    search_kwargs: dict = Field(default_factory=dict)
+
+    def _candidates(self, store, partitions, query_embedding, fetch_k):
+        where = None
+        if len(partitions) < sum(1 for s in self.partition_stores.values() if s is store):
+            where = {"partition": {"$in": partitions}}
+        result = store._collection.query(
+            query_embeddings=[query_embedding],
+            n_results=fetch_k,
+            where=where,
+            include=["documents", "metadatas", "distances", "embeddings"],
+        )
+        return list(zip(result["ids"][0], result["documents"][0], result["metadatas"][0],
+                        result["distances"][0], result["embeddings"][0]))
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        k = self.search_kwargs.get("k", 4)
+        fetch_k = self.search_kwargs.get("fetch_k", 20)
+        lambda_mult = self.search_kwargs.get("lambda_mult", 0.5)
+        query_embedding = self.embeddings.embed_query(query)
+        partitions = self.router.route(query, query_embedding) or list(self.partition_stores)
+
+        by_store = {}
+        for partition in partitions:
+            store = self.partition_stores.get(partition)
+            if store is not None:
+                by_store.setdefault(id(store), (store, []))[1].append(partition)
+        candidates = []
+        for store, parts in by_store.values():
+            candidates.extend(self._candidates(store, parts, query_embedding, fetch_k))
+        if not candidates:
+            return []
+        candidates.sort(key=lambda c: c[3])
+        candidates = candidates[:fetch_k]
+
+        if self.search_type == "mmr":
+            picked = maximal_marginal_relevance(
+                np.array(query_embedding, dtype=np.float32),
+                [c[4] for c in candidates],
+                k=k,
+                lambda_mult=lambda_mult,
+            )
+        else:
+            picked = range(min(k, len(candidates)))
+        logger.debug("Routed query to partitions %s", partitions)
+        return [Document(id=candidates[i][0], page_content=candidates[i][1], metadata=candidates[i][2] or {}) for i in picked]
@@ -0,0 +1,154 @@
+import hmac
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from functools import wraps
+
+# Profiling is off unless an admin token is configured: it is needed both to
+# request a profile via header and to download the results.
+PROFILE_ADMIN_TOKEN = os.getenv("PROFILE_ADMIN_TOKEN")
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_BUFFER_SIZE = int(os.getenv("PROFILE_BUFFER_SIZE", "20"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILING_ENABLED = bool(PROFILE_ADMIN_TOKEN)
+
+# Set per request by the HTTP middleware when this request should be profiled.
+# The dict is shared with the endpoint thread, which writes back "profile_id".
+profile_request: ContextVar = ContextVar("profile_request", default=None)
+
+_profiles = deque(maxlen=PROFILE_BUFFER_SIZE)
+_profiles_lock = threading.Lock()
+# One profile at a time keeps the sampler's overhead off concurrent requests.
+_profiler_busy = threading.Lock()
+
+
+def is_admin(token):
+    return PROFILING_ENABLED and token is not None and hmac.compare_digest(token, PROFILE_ADMIN_TOKEN)
+
+
+def start_profile_request(endpoint, method, profile_header, admin_token):
+    """Return the per-request profiling marker, or None if this request is not profiled."""
+    if not PROFILING_ENABLED:
+        return None
+    if profile_header == "1" and is_admin(admin_token):
+        trigger = "header"
+    elif PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE:
+        trigger = "sample"
+    else:
+        return None
+    return {"endpoint": endpoint, "method": method, "trigger": trigger}
+
+
+class _StackSampler:
+    """Samples one thread's Python stack at a fixed interval."""
+
+    def __init__(self, thread_id, root_frame, interval):
+        self.thread_id = thread_id
+        self.root_frame = root_frame
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="g2g-profiler", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None and frame is not self.root_frame:
+                code = frame.f_code
+                filename = "/".join(code.co_filename.replace("\\", "/").split("/")[-2:])
+                stack.append(f"{code.co_name} ({filename}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[tuple(reversed(stack))] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+
+def _call_tree(stacks):
+    root = {"name": "<root>", "samples": 0, "children": {}}
+    for stack, count in stacks.items():
+        root["samples"] += count
+        node = root
+        for name in stack:
+            node = node["children"].setdefault(name, {"name": name, "samples": 0, "children": {}})
+            node["samples"] += count
+
+    def finish(node):
+        children = sorted(node["children"].values(), key=lambda n: n["samples"], reverse=True)
+        return {"name": node["name"], "samples": node["samples"], "children": [finish(c) for c in children]}
+
+    return finish(root)
+
+
+def _store(marker, sampler, wall, cpu, started_at):
+    profile_id = uuid.uuid4().hex[:12]
+    collapsed = "\n".join(f"{';'.join(stack)} {count}" for stack, count in sampler.stacks.most_common())
+    profile = {
+        "id": profile_id,
+        "endpoint": marker["endpoint"],
+        "method": marker["method"],
+        "trigger": marker["trigger"],
+        "started_at": started_at,
+        "wall_ms": round(wall * 1000, 2),
+        "cpu_ms": round(cpu * 1000, 2),
+        # Time the thread spent off-CPU: waiting on Ollama, the DB, locks or the GIL.
+        "wait_ms": round(max(wall - cpu, 0.0) * 1000, 2),
+        "interval_ms": PROFILE_INTERVAL_MS,
+        "samples": sum(sampler.stacks.values()),
+        "tree": _call_tree(sampler.stacks),
+        "collapsed": collapsed,
+    }
+    with _profiles_lock:
+        _profiles.append(profile)
+    marker["profile_id"] = profile_id
+
+
+def profiled(func):
+    """Profile a sync endpoint when the current request was selected for profiling."""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        marker = profile_request.get()
+        if marker is None or not _profiler_busy.acquire(blocking=False):
+            return func(*args, **kwargs)
+        try:
+            sampler = _StackSampler(threading.get_ident(), sys._getframe(), PROFILE_INTERVAL_MS / 1000)
+            started_at = datetime.now(timezone.utc).isoformat()
+            wall0, cpu0 = time.perf_counter(), time.thread_time()
+            sampler.start()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                sampler.stop()
+                _store(marker, sampler, time.perf_counter() - wall0, time.thread_time() - cpu0, started_at)
+        finally:
+            _profiler_busy.release()
+    return wrapper
+
+
+def list_profiles():
+    with _profiles_lock:
+        profiles = list(_profiles)
+    return [
+        {k: p[k] for k in ("id", "endpoint", "method", "trigger", "started_at", "wall_ms", "cpu_ms", "wait_ms", "samples")}
+        for p in reversed(profiles)
+    ]
+
+
+def get_profile(profile_id):
+    with _profiles_lock:
+        for p in _profiles:
+            if p["id"] == profile_id:
+                return p
+    return None
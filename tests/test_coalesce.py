@@ -0,0 +1,97 @@
+import threading
+import time
+
+import pytest
+from prometheus_client import REGISTRY
+
+from coalesce import SingleFlight
+
+
+def coalesced(name):
+    return REGISTRY.get_sample_value("g2g_coalesced_requests_total", {"flight": name}) or 0
+
+
+def run_followers(flight, name, key, fn, count):
+    """Start `count` callers behind an in-flight leader; wait until all have attached."""
+    before = coalesced(name)
+    results = []
+
+    def follow():
+        try:
+            results.append(flight.do(key, fn))
+        except Exception as e:
+            results.append(e)
+
+    threads = [threading.Thread(target=follow) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    end = time.monotonic() + 2
+    while coalesced(name) < before + count:
+        assert time.monotonic() < end, "followers never attached"
+        time.sleep(0.005)
+    return threads, results
+
+
+def test_followers_share_the_leaders_result():
+    flight = SingleFlight("test_result")
+    release = threading.Event()
+    calls = []
+
+    def work():
+        calls.append(1)
+        release.wait(2)
+        return {"answer": 42}
+
+    leader_result = []
+    leader = threading.Thread(target=lambda: leader_result.append(flight.do("q", work)))
+    leader.start()
+    while flight.in_flight() == 0:
+        time.sleep(0.005)
+    threads, results = run_followers(flight, "test_result", "q", work, 3)
+    release.set()
+    for thread in threads + [leader]:
+        thread.join(2)
+
+    assert len(calls) == 1
+    assert all(r is leader_result[0] for r in results)
+    assert flight.in_flight() == 0
+
+
+def test_followers_see_the_leaders_exception():
+    flight = SingleFlight("test_error")
+    release = threading.Event()
+    error = ValueError("boom")
+
+    def work():
+        release.wait(2)
+        raise error
+
+    leader_error = []
+
+    def lead():
+        try:
+            flight.do("q", work)
+        except ValueError as e:
+            leader_error.append(e)
+
+    leader = threading.Thread(target=lead)
+    leader.start()
+    while flight.in_flight() == 0:
+        time.sleep(0.005)
+    threads, results = run_followers(flight, "test_error", "q", work, 2)
+    release.set()
+    for thread in threads + [leader]:
+        thread.join(2)
+
+    assert leader_error == [error]
+    assert results == [error, error]
+    assert flight.in_flight() == 0
+
+
+def test_nothing_is_cached_after_the_call_finishes():
+    flight = SingleFlight("test_nocache")
+    assert flight.do("q", lambda: 1) == 1
+    assert flight.do("q", lambda: 2) == 2
+    with pytest.raises(KeyError):
+        flight.do("q", lambda: {}["missing"])
+    assert flight.in_flight() == 0
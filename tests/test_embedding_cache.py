@@ -0,0 +1,85 @@
+import json
+import os
+
+from embedding_cache import KEY_SIZE, CachedEmbeddings
+
+
+class CountingEmbedder:
+    def __init__(self):
+        self.calls = []
+
+    def embed_documents(self, texts):
+        self.calls.append(list(texts))
+        return [[float(len(t)), 1.0, 2.0] for t in texts]
+
+    def embed_query(self, text):
+        return [0.0, 0.0, float(len(text))]
+
+
+def open_cache(tmp_path, embedder=None):
+    return CachedEmbeddings(embedder or CountingEmbedder(), "test/model", directory=str(tmp_path))
+
+
+def test_only_unseen_texts_are_embedded_across_restarts(tmp_path):
+    embedder = CountingEmbedder()
+    cache = open_cache(tmp_path, embedder)
+    assert cache.embed_documents(["ab", "abc", "ab"]) == [[2.0, 1.0, 2.0], [3.0, 1.0, 2.0], [2.0, 1.0, 2.0]]
+    assert embedder.calls == [["ab", "abc"]]
+
+    embedder = CountingEmbedder()
+    reopened = open_cache(tmp_path, embedder)
+    assert reopened.embed_documents(["abc", "abcd"]) == [[3.0, 1.0, 2.0], [4.0, 1.0, 2.0]]
+    assert embedder.calls == [["abcd"]]
+    assert reopened.embed_query("xy") == [0.0, 0.0, 2.0]
+
+
+def test_torn_tail_is_trimmed_to_whole_rows(tmp_path):
+    cache = open_cache(tmp_path)
+    cache.embed_documents(["one", "two"])
+    # A crash mid-append: a full vector row with no key, plus half a key.
+    with open(cache._vectors_path, "ab") as f:
+        f.write(b"\0" * 12)
+    with open(cache._keys_path, "ab") as f:
+        f.write(b"\1" * (KEY_SIZE // 2))
+
+    reopened = open_cache(tmp_path)
+    assert len(reopened._index) == 2
+    assert os.path.getsize(reopened._keys_path) == 2 * KEY_SIZE
+    assert os.path.getsize(reopened._vectors_path) == 2 * 3 * 4
+    assert reopened.embed_documents(["two", "three"]) == [[3.0, 1.0, 2.0], [5.0, 1.0, 2.0]]
+    assert len(open_cache(tmp_path)._index) == 3
+
+
+def test_meta_without_data_files_starts_empty(tmp_path):
+    cache = open_cache(tmp_path)
+    os.makedirs(cache.directory, exist_ok=True)
+    with open(cache._meta_path, "w") as f:
+        json.dump({"model": "test/model", "dim": 3}, f)
+
+    reopened = open_cache(tmp_path)
+    assert reopened._index == {}
+    assert reopened.embed_documents(["ab"]) == [[2.0, 1.0, 2.0]]
+    assert len(open_cache(tmp_path)._index) == 1
+
+
+def test_unreadable_cache_is_reset(tmp_path):
+    cache = open_cache(tmp_path)
+    cache.embed_documents(["ab", "abc"])
+    with open(cache._meta_path, "w") as f:
+        f.write("{not json")
+
+    reopened = open_cache(tmp_path)
+    assert reopened._index == {}
+    assert not os.path.exists(reopened._vectors_path)
+    assert reopened.embed_documents(["abc"]) == [[3.0, 1.0, 2.0]]
+    assert len(open_cache(tmp_path)._index) == 1
+
+
+def test_data_without_meta_is_discarded(tmp_path):
+    cache = open_cache(tmp_path)
+    cache.embed_documents(["ab"])
+    os.remove(cache._meta_path)
+
+    reopened = open_cache(tmp_path)
+    assert reopened._index == {}
+    assert not os.path.exists(reopened._keys_path)
@@ -0,0 +1,66 @@
+import os
+from io import BytesIO
+
+from PIL import Image
+
+from image_cache import ImageVariantCache, etag_matches, render_variant
+
+
+def test_least_recently_used_variants_are_evicted(tmp_path):
+    cache = ImageVariantCache(directory=str(tmp_path), max_bytes=25)
+    cache.put("a", "png", b"x" * 10)
+    cache.put("b", "png", b"x" * 10)
+    assert cache.get("a", "png")  # a is now most recently used
+    cache.put("c", "png", b"x" * 10)
+
+    assert cache.get("b", "png") is None
+    assert not os.path.exists(tmp_path / "b.png")
+    assert cache.get("a", "png") == str(tmp_path / "a.png")
+    assert cache.get("c", "png") == str(tmp_path / "c.png")
+
+
+def test_oversized_variant_is_kept_alone(tmp_path):
+    cache = ImageVariantCache(directory=str(tmp_path), max_bytes=5)
+    cache.put("a", "png", b"x" * 3)
+    cache.put("b", "png", b"x" * 10)
+    assert cache.get("a", "png") is None
+    assert cache.get("b", "png")
+
+
+def test_existing_files_are_reloaded_and_temp_files_ignored(tmp_path):
+    cache = ImageVariantCache(directory=str(tmp_path), max_bytes=100)
+    cache.put("a", "webp", b"x" * 10)
+    (tmp_path / "b.webp.123.tmp").write_bytes(b"partial")
+
+    reopened = ImageVariantCache(directory=str(tmp_path), max_bytes=100)
+    assert reopened.get("a", "webp") == str(tmp_path / "a.webp")
+    assert reopened.get("b", "webp") is None
+
+
+def test_key_changes_when_the_source_file_changes(tmp_path):
+    source = tmp_path / "doc.docx"
+    source.write_bytes(b"one")
+    before = ImageVariantCache.key(str(source), "doc.docx::img0_0", 320, "webp")
+    assert before == ImageVariantCache.key(str(source), "doc.docx::img0_0", 320, "webp")
+    assert before != ImageVariantCache.key(str(source), "doc.docx::img0_0", 640, "webp")
+    source.write_bytes(b"changed")
+    assert before != ImageVariantCache.key(str(source), "doc.docx::img0_0", 320, "webp")
+
+
+def test_etag_matches():
+    etag = '"abc"'
+    assert etag_matches('"abc"', etag)
+    assert etag_matches('W/"abc"', etag)
+    assert etag_matches('"x", "abc"', etag)
+    assert etag_matches("*", etag)
+    assert not etag_matches('"abcd"', etag)
+    assert not etag_matches(None, etag)
+    assert not etag_matches("", etag)
+
+
+def test_render_variant_downscales_but_never_upscales():
+    img = Image.new("RGBA", (400, 200), (255, 0, 0, 128))
+    small = Image.open(BytesIO(render_variant(img, 100, "jpeg")))
+    assert (small.format, small.size) == ("JPEG", (100, 50))
+    same = Image.open(BytesIO(render_variant(img, 800, "png")))
+    assert (same.format, same.size) == ("PNG", (400, 200))
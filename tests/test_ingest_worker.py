@@ -0,0 +1,60 @@
+from docx import Document
+
+import ingest_worker
+from ingest_worker import CHUNK_SCHEMA_VERSION, parse_and_split
+
+
+def make_docx(path, paragraphs):
+    doc = Document()
+    for text, style in paragraphs:
+        doc.add_paragraph(text, style=style)
+    doc.save(path)
+    return str(path)
+
+
+def test_sections_are_merged_and_prefixed_with_their_heading_path(tmp_path):
+    path = make_docx(tmp_path / "guide.docx", [
+        ("User Guide", "Title"),                      # 0
+        ("Welcome to the portal.", None),             # 1
+        ("Leave", "Heading 1"),                       # 2
+        ("Open the leave page.", None),               # 3
+        ("Pick the dates you need.", None),           # 4
+        ("ok", None),                                 # 5: too short, skipped
+        ("Apply", "Heading 2"),                       # 6
+        ("Press submit to apply.", None),             # 7
+        ("Payroll", "Heading 1"),                     # 8
+        ("Payslips arrive monthly.", None),           # 9
+    ])
+    chunks = parse_and_split(path, "guide.docx", "guide")
+
+    assert [(text, meta["para_index"], meta["para_end"]) for text, meta in chunks] == [
+        ("User Guide\nWelcome to the portal.", 1, 1),
+        ("User Guide > Leave\nOpen the leave page.\nPick the dates you need.", 3, 4),
+        ("User Guide > Leave > Apply\nPress submit to apply.", 7, 7),
+        ("User Guide > Payroll\nPayslips arrive monthly.", 9, 9),
+    ]
+    for _, meta in chunks:
+        assert meta["source"] == "guide.docx"
+        assert meta["partition"] == "guide"
+        assert meta["chunk_schema"] == CHUNK_SCHEMA_VERSION
+
+
+def test_sections_are_split_at_the_token_budget(tmp_path, monkeypatch):
+    monkeypatch.setattr(ingest_worker, "CHUNK_TOKEN_BUDGET", 10)  # 40 characters
+    long_text = " ".join(["word"] * 30)                            # 149 characters
+    path = make_docx(tmp_path / "steps.docx", [
+        ("Steps", "Heading 1"),                                    # 0
+        ("First step is twenty five.", None),                      # 1
+        ("Second step also fits.", None),                          # 2
+        (long_text, None),                                         # 3
+        ("Last step.", None),                                      # 4
+    ])
+    chunks = parse_and_split(path, "steps.docx", "steps")
+    ranges = [(meta["para_index"], meta["para_end"]) for _, meta in chunks]
+
+    assert ranges[0] == (1, 1)
+    assert ranges[1] == (2, 2)
+    assert len([r for r in ranges if r == (3, 3)]) > 1  # oversized paragraph split on its own
+    assert ranges[-1] == (4, 4)
+    assert all(text.startswith("Steps\n") for text, _ in chunks)
+    assert all(len(text) <= len("Steps\n") + 40 for text, _ in chunks)
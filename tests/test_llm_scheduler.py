@@ -0,0 +1,78 @@
+import threading
+import time
+
+import pytest
+
+from llm_scheduler import LLMBusy, LLMScheduler
+
+
+def wait_until(predicate, timeout=2.0):
+    end = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > end:
+            raise AssertionError("condition not reached")
+        time.sleep(0.005)
+
+
+def queue_behind(scheduler, order, kind, user, deadline=None):
+    """Start a thread that queues for a slot and records when it gets one."""
+    queued = scheduler.stats()["queued"]
+
+    def run():
+        with scheduler.slot(kind, user, deadline):
+            order.append((kind, user))
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    wait_until(lambda: scheduler.stats()["queued"] == queued + 1)
+    return thread
+
+
+def test_classes_are_served_in_priority_order():
+    scheduler = LLMScheduler(max_concurrency=1, max_queue=8)
+    order = []
+    with scheduler.slot("chat", "holder"):
+        threads = [queue_behind(scheduler, order, kind, "u") for kind in ("suggest", "ask", "chat")]
+    for thread in threads:
+        thread.join(2)
+    assert [kind for kind, _ in order] == ["chat", "ask", "suggest"]
+
+
+def test_users_take_turns_within_a_class():
+    scheduler = LLMScheduler(max_concurrency=1, max_queue=8)
+    order = []
+    with scheduler.slot("chat", "holder"):
+        threads = [queue_behind(scheduler, order, "chat", user) for user in ("alice", "alice", "bob")]
+    for thread in threads:
+        thread.join(2)
+    assert [user for _, user in order] == ["alice", "bob", "alice"]
+
+
+def test_full_queue_is_rejected():
+    scheduler = LLMScheduler(max_concurrency=1, max_queue=1)
+    order = []
+    with scheduler.slot("chat", "holder"):
+        thread = queue_behind(scheduler, order, "chat", "u")
+        with pytest.raises(LLMBusy) as excinfo:
+            with scheduler.slot("ask", "v"):
+                pass
+    thread.join(2)
+    assert excinfo.value.reason == "queue full"
+    assert excinfo.value.retry_after >= 1
+    assert order == [("chat", "u")]
+
+
+def test_ticket_past_its_deadline_is_dropped_and_the_next_one_served():
+    scheduler = LLMScheduler(max_concurrency=1, max_queue=8)
+    order = []
+    with scheduler.slot("chat", "holder"):
+        waiter = queue_behind(scheduler, order, "ask", "patient")
+        with pytest.raises(LLMBusy) as excinfo:
+            with scheduler.slot("chat", "hasty", deadline=time.monotonic() + 0.05):
+                pass
+        assert scheduler.stats()["queued"] == 1
+    waiter.join(2)
+    assert excinfo.value.reason == "deadline exceeded while queued"
+    assert order == [("ask", "patient")]
+    stats = scheduler.stats()
+    assert (stats["active"], stats["queued"]) == (0, 0)
@@ -0,0 +1,133 @@
+import numpy as np
+
+from partition_router import PartitionRouter, PartitionedRetriever, partition_slug, scan_partitions
+
+
+class FakeCollection:
+    def __init__(self, rows):
+        self.rows = rows  # (id, text, metadata, embedding)
+        self.queries = []
+
+    def query(self, query_embeddings, n_results, where, include):
+        self.queries.append(where)
+        q = np.asarray(query_embeddings[0], dtype=float)
+        rows = self.rows
+        if where:
+            rows = [r for r in rows if r[2].get("partition") in where["partition"]["$in"]]
+        scored = sorted(
+            (1 - float(np.dot(q, r[3]) / (np.linalg.norm(q) * np.linalg.norm(r[3]))), r) for r in rows
+        )[:n_results]
+        return {
+            "ids": [[r[0] for _, r in scored]],
+            "documents": [[r[1] for _, r in scored]],
+            "metadatas": [[r[2] for _, r in scored]],
+            "distances": [[d for d, _ in scored]],
+            "embeddings": [[r[3] for _, r in scored]],
+        }
+
+
+class FakeStore:
+    def __init__(self, rows):
+        self._collection = FakeCollection(rows)
+
+    def get(self, include, limit, offset):
+        page = self._collection.rows[offset:offset + limit]
+        return {"embeddings": [r[3] for r in page], "metadatas": [r[2] for r in page]}
+
+
+class FakeEmbeddings:
+    def __init__(self, vectors):
+        self.vectors = vectors
+
+    def embed_query(self, text):
+        return self.vectors[text]
+
+
+def row(chunk_id, partition, vector, source=None):
+    meta = {"source": source or f"{partition}.docx"}
+    if partition:
+        meta["partition"] = partition
+    return (chunk_id, f"text {chunk_id}", meta, list(vector))
+
+
+def test_partition_slug_fits_collection_names():
+    assert partition_slug("Leave & Attendance") == "leave-attendance"
+    assert partition_slug("***") == "default"
+    assert len("g2g_docs__" + partition_slug("x" * 200)) <= 63
+
+
+def test_scan_partitions_pages_through_stores_and_skips_untagged_chunks():
+    leave = FakeStore([row("l1", "leave", [1, 0, 0]), row("l2", "leave", [0, 1, 0]), row("x", None, [0, 0, 1])])
+    payroll = FakeStore([row("p1", "payroll", [0, 0, 2], source="Payroll_Guide.docx")])
+    homes, centroids, words, counts = scan_partitions([leave, payroll], page_size=1)
+
+    assert homes == {"leave": leave, "payroll": payroll}
+    assert counts == {"leave": 2, "payroll": 1}
+    np.testing.assert_allclose(centroids["leave"], [2 ** -0.5, 2 ** -0.5, 0], rtol=1e-6)
+    np.testing.assert_allclose(centroids["payroll"], [0, 0, 1])
+    assert words["payroll"] == {"payroll"}
+
+
+def test_router_returns_every_partition_when_there_are_few():
+    router = PartitionRouter({"a": np.array([1.0, 0]), "b": np.array([0, 1.0])}, {}, top_n=2)
+    assert router.route("anything", [1, 0]) == ["a", "b"]
+
+
+def test_router_picks_closest_centroids_and_boosts_keyword_matches():
+    centroids = {
+        "leave": np.array([1.0, 0, 0]),
+        "payroll": np.array([0, 1.0, 0]),
+        "onboarding": np.array([0, 0, 1.0]),
+    }
+    words = {"leave": {"leave"}, "payroll": {"payroll", "salary"}, "onboarding": {"onboarding"}}
+    router = PartitionRouter(centroids, words, top_n=1, keyword_boost=0.5)
+
+    assert router.route("how many days off", [0.9, 0.3, 0]) == ["leave"]
+    # Embedding still leans to leave, but the keyword pushes payroll ahead.
+    assert router.route("when is salary paid", [0.9, 0.6, 0]) == ["payroll"]
+
+
+def test_retriever_filters_a_shared_store_to_the_routed_partitions():
+    store = FakeStore([
+        row("l1", "leave", [1, 0.1, 0]),
+        row("p1", "payroll", [0.9, 0.2, 0]),
+        row("o1", "onboarding", [0, 0, 1]),
+    ])
+    stores = {"leave": store, "payroll": store, "onboarding": store}
+    router = PartitionRouter(
+        {"leave": np.array([1.0, 0, 0]), "payroll": np.array([0, 1.0, 0]), "onboarding": np.array([0, 0, 1.0])},
+        {}, top_n=2,
+    )
+    retriever = PartitionedRetriever(
+        partition_stores=stores, router=router, embeddings=FakeEmbeddings({"q": [1, 0.5, 0]}),
+        search_type="similarity", search_kwargs={"k": 3, "fetch_k": 10},
+    )
+    docs = retriever.invoke("q")
+
+    assert store._collection.queries == [{"partition": {"$in": ["leave", "payroll"]}}]
+    assert {d.id for d in docs} == {"l1", "p1"}
+
+
+def test_retriever_merges_shards_by_distance_before_mmr():
+    leave = FakeStore([row("l1", "leave", [1, 0, 0]), row("l2", "leave", [0.7, 0.7, 0])])
+    payroll = FakeStore([row("p1", "payroll", [0.95, 0.05, 0]), row("p2", "payroll", [0, 1, 0])])
+    router = PartitionRouter({"leave": np.array([1.0, 0, 0]), "payroll": np.array([0, 1.0, 0])}, {}, top_n=2)
+    retriever = PartitionedRetriever(
+        partition_stores={"leave": leave, "payroll": payroll}, router=router,
+        embeddings=FakeEmbeddings({"q": [1, 0, 0]}),
+        search_kwargs={"k": 2, "fetch_k": 3, "lambda_mult": 1.0},
+    )
+    docs = retriever.invoke("q")
+
+    # One store per partition: no metadata filter needed.
+    assert leave._collection.queries == [None] and payroll._collection.queries == [None]
+    # lambda_mult=1 is pure relevance, so MMR keeps the two nearest across both shards.
+    assert [d.id for d in docs] == ["l1", "p1"]
+    assert docs[1].metadata["partition"] == "payroll"
+
+
+def test_retriever_with_an_empty_index_returns_nothing():
+    retriever = PartitionedRetriever(
+        partition_stores={}, router=PartitionRouter({}, {}), embeddings=FakeEmbeddings({"q": [1, 0]}),
+    )
+    assert retriever.invoke("q") == []